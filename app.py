@@ -1,14 +1,22 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import requests
+from requests.adapters import HTTPAdapter
+import pyarrow as pa
+import numpy as np
 import time
 from datetime import datetime, timedelta
 import re
 import os
+import logging
+from functools import lru_cache
 from dotenv import load_dotenv
 from dateutil.tz import gettz, UTC
 
 load_dotenv()
 
+_log = logging.getLogger(__name__)
+
 # Page configuration
 st.set_page_config(
     page_title="Car Scout",
@@ -21,8 +29,53 @@ st.set_page_config(
 API_PORT = int(os.getenv("PORT", 5001))
 API_BASE_URL = f"http://localhost:{API_PORT}/api"
 
+# Shared HTTP session so every backend call reuses pooled keep-alive connections
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=1)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+# Total time budget for the dashboard fetch, shared across concurrent requests
+DASHBOARD_DEADLINE_SECONDS = 2.0
+
+# Precompiled patterns
+_NON_DIGIT_RE = re.compile(r'\D')
+
+# Visits are stored in UTC and displayed in Central Time
+_CT_TZ = gettz('America/Chicago')
+
+# Numeric Listings table columns are sent raw and formatted client-side
+_LISTING_COLUMN_CONFIG = {
+    "Year": st.column_config.NumberColumn(format="%d"),
+    "Miles": st.column_config.NumberColumn(format="%d"),
+    "Price": st.column_config.NumberColumn(format="$%d"),
+}
+
+# Above this many points the scatter plot is binned to roughly pixel resolution
+_SCATTER_DOWNSAMPLE_THRESHOLD = 5000
+_SCATTER_GRID = (800, 600)
+
+# Calendar HTML fragments
+_DAY_CELL_OPEN = '<div class="calendar-day-cell">'
+_DIV_CLOSE = '</div>'
+_DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+_CALENDAR_HOURS = range(9, 19)  # 9 AM to 6 PM
+_HOUR_LABELS = tuple(f"{hour % 12 or 12}{'AM' if hour < 12 else 'PM'}" for hour in _CALENDAR_HOURS)
+_TIME_CELL_TMPL = '<div class="calendar-time-cell">{}</div>'
+# Opening of each hour row, including its time label
+_HOUR_ROW_HEADS = tuple('<div class="calendar-row">' + _TIME_CELL_TMPL.format(label) for label in _HOUR_LABELS)
+_CALENDAR_HEADER_OPEN = '<div class="calendar-header"><div class="calendar-header-cell"></div>'
+_EMPTY_DAY_CELLS = (_DAY_CELL_OPEN + _DIV_CLOSE) * 7
+_VISIT_ITEM_TMPL = '<div class="visit-item" data-visit-id="{0}">{1}<br>{2}</div>'
+
+# Calendar component - renders the calendar HTML and returns the clicked visit
+_visit_calendar = components.declare_component(
+    "visit_calendar",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "calendar_component")
+)
+
 # Custom CSS - Modern, clean design
-st.markdown("""
+_CSS_BLOCK = """
 <style>
     /* Main container - White background */
     .main {
@@ -288,84 +341,22 @@ st.markdown("""
     .status-offline {
         background-color: #dc3545;
     }
-    
-    /* Calendar styling */
-    .calendar-container {
-        border: 2px solid #dee2e6;
-        border-radius: 8px;
-        overflow: hidden;
-        background-color: #ffffff;
-    }
-    
-    .calendar-header {
-        display: grid;
-        grid-template-columns: 80px repeat(7, 1fr);
-        background-color: #f8f9fa;
-        border-bottom: 2px solid #dee2e6;
-    }
-    
-    .calendar-header-cell {
-        padding: 0.75rem;
-        text-align: center;
-        font-weight: 600;
-        border-right: 1px solid #dee2e6;
-        color: #212529;
-    }
-    
-    .calendar-header-cell:last-child {
-        border-right: none;
-    }
-    
-    .calendar-time-cell {
-        padding: 0.5rem;
-        text-align: right;
-        font-size: 0.85rem;
-        color: #6c757d;
-        border-right: 1px solid #dee2e6;
-        border-bottom: 1px solid #e9ecef;
-        background-color: #f8f9fa;
-        min-height: 60px;
-    }
-    
-    .calendar-day-cell {
-        padding: 0.5rem;
-        border-right: 1px solid #dee2e6;
-        border-bottom: 1px solid #e9ecef;
-        min-height: 60px;
-        position: relative;
-    }
-    
-    .calendar-day-cell:last-child {
-        border-right: none;
-    }
-    
-    .calendar-row {
-        display: grid;
-        grid-template-columns: 80px repeat(7, 1fr);
-    }
-    
-    .visit-item {
-        background-color: #007bff;
-        color: white;
-        padding: 0.25rem 0.5rem;
-        border-radius: 4px;
-        margin: 0.25rem 0;
-        font-size: 0.75rem;
-        cursor: pointer;
-        transition: background-color 0.2s;
-    }
-    
-    .visit-item:hover {
-        background-color: #0056b3;
-        cursor: pointer;
-    }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+def _inject_css():
+    """Emit the stylesheet; Streamlit drops elements that are not re-emitted on a rerun"""
+    st.markdown(_CSS_BLOCK, unsafe_allow_html=True)
+
 
+_inject_css()
 
+
+@lru_cache(maxsize=4096)
 def format_phone_number(phone):
     """Format phone number for display"""
-    cleaned = re.sub(r'\D', '', phone)
+    cleaned = _NON_DIGIT_RE.sub('', phone)
     if len(cleaned) == 11 and cleaned[0] == '1':
         return f"+1 ({cleaned[1:4]}) {cleaned[4:7]}-{cleaned[7:]}"
     elif len(cleaned) == 10:
@@ -380,19 +371,9 @@ def format_time(timestamp):
     
     try:
         if isinstance(timestamp, str):
-            # Try parsing ISO format
-            try:
-                if 'T' in timestamp:
-                    date = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                else:
-                    # Try other formats
-                    date = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-            except:
-                # Try with timezone
-                try:
-                    date = datetime.fromisoformat(timestamp)
-                except:
-                    return timestamp[:10] if len(timestamp) >= 10 else timestamp
+            # Backend timestamps are ISO 8601 (optionally with a trailing Z);
+            # fromisoformat also accepts the 'YYYY-MM-DD HH:MM:SS' form
+            date = datetime.fromisoformat(timestamp[:-1] + '+00:00' if timestamp.endswith('Z') else timestamp)
         else:
             date = timestamp
         
@@ -423,15 +404,199 @@ def format_time(timestamp):
         return ''
 
 
+def _to_central_time(date):
+    """Convert a datetime to Central Time, treating naive values as UTC"""
+    if date.tzinfo:
+        return date.astimezone(_CT_TZ)
+    return date.replace(tzinfo=UTC).astimezone(_CT_TZ)
+
+
+@lru_cache(maxsize=1024)
+def _parse_visit_time_str(value):
+    return _to_central_time(datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value))
+
+
+def parse_visit_time(value):
+    """Parse a visit's scheduledTime into a timezone-aware Central Time datetime"""
+    if isinstance(value, str):
+        return _parse_visit_time_str(value)
+    return _to_central_time(value)
+
+
+@st.cache_data(ttl=5, show_spinner=False)
 def check_api_connection():
     """Check if the API is reachable"""
     try:
-        response = requests.get(f"{API_BASE_URL}", timeout=2)
+        response = _SESSION.get(f"{API_BASE_URL}", timeout=2)
         return response.status_code == 200
     except:
         return False
 
 
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_dashboard_summary():
+    """Fetch database status and thread/listing counts for the dashboard"""
+    try:
+        response = _SESSION.get(f"{API_BASE_URL}/dashboard-summary", timeout=DASHBOARD_DEADLINE_SECONDS)
+        return response.json() if response.status_code == 200 else None
+    except:
+        return None
+
+
+@st.cache_resource(ttl=10, show_spinner=False)
+def fetch_all_listings():
+    """Fetch all car listings; raises requests.HTTPError on a non-200 response
+
+    Cached as a shared resource so reruns skip re-pickling the payload; treat the result as read-only.
+    """
+    response = _SESSION.get(f"{API_BASE_URL}/car-listings", timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+_HOVER_TEMPLATE = (
+    "Make: {}<br>Model: {}<br>Year: {}<br>Miles: {}<br>Price: {}<br>Tires: {}<br>"
+    "Title: {}<br>Carfax: {}<br>Doc Fee: {}<br>Lowest Price: {}<br>Phone: {}"
+)
+
+
+def _fmt_count(value):
+    return f"{value:,}" if value is not None else "N/A"
+
+
+def _fmt_money(value):
+    return f"${value:,}" if value is not None else "N/A"
+
+
+def _fmt_tires(value):
+    return 'Yes' if value else 'No' if value is not None else 'N/A'
+
+
+def build_scatter_data(valid_listings):
+    """Build the x/y arrays and hover text for the Price vs Miles plot"""
+    columns = {
+        field: [l.get(field) for l in valid_listings]
+        for field in ('miles', 'listingPrice', 'tireLifeLeft', 'docFeeQuoted', 'lowestPrice')
+    }
+    labels = {
+        field: [l.get(field, 'N/A') for l in valid_listings]
+        for field in ('make', 'model', 'year', 'titleStatus', 'carfaxDamageIncidents', 'phoneNumber')
+    }
+    hover_texts = [
+        _HOVER_TEMPLATE.format(
+            make, model, year, _fmt_count(miles), _fmt_money(price), _fmt_tires(tires),
+            title, carfax, _fmt_money(doc_fee), _fmt_money(lowest), phone
+        )
+        for make, model, year, miles, price, tires, title, carfax, doc_fee, lowest, phone in zip(
+            labels['make'], labels['model'], labels['year'], columns['miles'], columns['listingPrice'],
+            columns['tireLifeLeft'], labels['titleStatus'], labels['carfaxDamageIncidents'],
+            columns['docFeeQuoted'], columns['lowestPrice'], labels['phoneNumber']
+        )
+    ]
+    x_data, y_data = columns['miles'], columns['listingPrice']
+    if len(x_data) > _SCATTER_DOWNSAMPLE_THRESHOLD:
+        x_data, y_data, hover_texts = _downsample_points(x_data, y_data, hover_texts)
+    return x_data, y_data, hover_texts
+
+
+def _downsample_points(x_data, y_data, hover_texts):
+    """Keep one point per grid cell so large datasets don't overwhelm the browser"""
+    x = np.asarray(x_data, dtype=float)
+    y = np.asarray(y_data, dtype=float)
+    x_step = (x.max() / _SCATTER_GRID[0]) or 1.0
+    y_step = (y.max() / _SCATTER_GRID[1]) or 1.0
+    cells = np.stack([np.round(x / x_step), np.round(y / y_step)], axis=1)
+    keep = np.sort(np.unique(cells, axis=0, return_index=True)[1])
+    return x[keep].tolist(), y[keep].tolist(), [hover_texts[i] for i in keep]
+
+
+_SCATTER_FIELDS = (
+    '_id', 'miles', 'listingPrice', 'tireLifeLeft', 'docFeeQuoted', 'lowestPrice',
+    'make', 'model', 'year', 'titleStatus', 'carfaxDamageIncidents', 'phoneNumber'
+)
+
+
+def _listings_fingerprint(listings):
+    """Cache key that changes whenever a plotted or hovered field changes (updates don't touch extractedAt)"""
+    return hash(tuple(tuple(l.get(field) for field in _SCATTER_FIELDS) for l in listings))
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def build_scatter_figure(fingerprint, _valid_listings):
+    """Build the Price vs Miles figure; reused across reruns while the fingerprint is unchanged"""
+    import plotly.graph_objects as go
+    
+    x_data, y_data, hover_texts = build_scatter_data(_valid_listings)
+    
+    fig = go.Figure()
+    
+    fig.add_trace(go.Scattergl(
+        x=x_data,
+        y=y_data,
+        mode='markers',
+        marker=dict(
+            size=12,
+            color='#007bff',
+            line=dict(width=2, color='#0056b3')
+        ),
+        text=hover_texts,
+        hoverinfo='text',
+        name='Cars'
+    ))
+    
+    fig.update_layout(
+        title="Car Listings: Price vs Miles",
+        xaxis_title="Number of Miles",
+        yaxis_title="Listing Price ($)",
+        height=600,
+        hovermode='closest',
+        margin=dict(l=80, r=20, t=50, b=60),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(
+            title_font=dict(color='#212529', size=14),
+            tickfont=dict(color='#212529', size=12),
+            showline=True,
+            linecolor='#212529',
+            linewidth=1
+        ),
+        yaxis=dict(
+            title_font=dict(color='#212529', size=14),
+            tickfont=dict(color='#212529', size=12),
+            showline=True,
+            linecolor='#212529',
+            linewidth=1
+        ),
+        title_font=dict(color='#212529')
+    )
+    
+    return fig
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_visits(start_date, end_date):
+    """Fetch visits for a date range; cached per (start_date, end_date) window
+
+    Raises requests.HTTPError on a non-200 response so a transient failure isn't cached.
+    """
+    response = _SESSION.get(
+        f"{API_BASE_URL}/visits",
+        params={"start_date": start_date, "end_date": end_date},
+        timeout=5
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=1, show_spinner=False)
+def week_window(week_offset):
+    """Return (today, week_start, week_end, day_dates) for the Monday-based week at week_offset"""
+    today = datetime.now()
+    week_start = today - timedelta(days=today.weekday()) + timedelta(weeks=week_offset)
+    day_dates = [week_start + timedelta(days=i) for i in range(7)]
+    return today, week_start, day_dates[-1], day_dates
+
+
 # Sidebar navigation
 st.sidebar.markdown("# Car Scout")
 page = st.sidebar.radio(
@@ -450,37 +615,29 @@ if page == "Home":
     st.title("Car Scout Dashboard")
     
     col1, col2, col3 = st.columns(3)
-    
+
+    # Fetch database status and counts in a single round-trip
+    summary = fetch_dashboard_summary() if api_connected else None
+
     with col1:
         st.metric("API Status", status_text)
-    
+
     with col2:
         if api_connected:
-            try:
-                db_response = requests.get(f"{API_BASE_URL}/test-db", timeout=2)
-                if db_response.status_code == 200:
-                    db_data = db_response.json()
-                    db_status = "🟢 Connected" if db_data.get("connected") else "🔴 Disconnected"
-                    st.metric("Database", db_status)
-                else:
-                    st.metric("Database", "🔴 Unknown")
-            except:
+            if summary is not None:
+                db_status = "🟢 Connected" if summary.get("db_ok") else "🔴 Disconnected"
+                st.metric("Database", db_status)
+            else:
                 st.metric("Database", "🔴 Unknown")
         else:
             st.metric("Database", "—")
-    
+
     with col3:
-        if api_connected:
-            try:
-                threads_response = requests.get(f"{API_BASE_URL}/threads", timeout=2)
-                listings_response = requests.get(f"{API_BASE_URL}/car-listings", timeout=2)
-                thread_count = len(threads_response.json()) if threads_response.status_code == 200 else 0
-                listing_count = len(listings_response.json()) if listings_response.status_code == 200 else 0
-                st.metric("Total Threads", thread_count)
-                st.metric("Total Listings", listing_count)
-            except:
-                st.metric("Total Threads", "—")
-                st.metric("Total Listings", "—")
+        if api_connected and summary is not None:
+            thread_count = summary.get("thread_count")
+            listing_count = summary.get("listing_count")
+            st.metric("Total Threads", thread_count if thread_count is not None else "—")
+            st.metric("Total Listings", listing_count if listing_count is not None else "—")
         else:
             st.metric("Total Threads", "—")
             st.metric("Total Listings", "—")
@@ -519,10 +676,7 @@ if page == "Home":
         
         # Calculate current week dates
         week_offset = st.session_state.get('calendar_week_offset', 0)
-        today = datetime.now()
-        days_since_monday = (today.weekday()) % 7
-        week_start = today - timedelta(days=days_since_monday) + timedelta(weeks=week_offset)
-        week_end = week_start + timedelta(days=6)
+        today, week_start, week_end, day_dates = week_window(week_offset)
         
         st.caption(f"Week of {week_start.strftime('%B %d, %Y')} - {week_end.strftime('%B %d, %Y')}")
         
@@ -530,214 +684,101 @@ if page == "Home":
         try:
             start_date = week_start.strftime('%Y-%m-%d')
             end_date = week_end.strftime('%Y-%m-%d')
-            visits_response = requests.get(
-                f"{API_BASE_URL}/visits",
-                params={"start_date": start_date, "end_date": end_date},
-                timeout=5
-            )
-            
-            visits = []
-            if visits_response.status_code == 200:
-                visits = visits_response.json()
+            visits = fetch_visits(start_date, end_date)
             
             # Create calendar grid
-            days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-            day_dates = [week_start + timedelta(days=i) for i in range(7)]
-            
             # Group visits by day
+            date_to_key = {day_date.date(): day_date.strftime('%Y-%m-%d') for day_date in day_dates}
             visits_by_day = {}
             for visit in visits:
                 visit_date_str = visit.get('scheduledTime', '')
                 if visit_date_str:
                     try:
-                        if isinstance(visit_date_str, str):
-                            # Handle ISO format with or without timezone
-                            if visit_date_str.endswith('Z'):
-                                visit_date = datetime.fromisoformat(visit_date_str.replace('Z', '+00:00'))
-                            elif '+' in visit_date_str or visit_date_str.endswith('+00:00'):
-                                visit_date = datetime.fromisoformat(visit_date_str)
-                            else:
-                                # Try parsing without timezone
-                                visit_date = datetime.fromisoformat(visit_date_str)
-                        else:
-                            visit_date = visit_date_str
-                        
-                        # Convert to date for comparison (handle timezone-aware dates)
-                        ct_tz = gettz('America/Chicago')
-                        if hasattr(visit_date, 'tzinfo') and visit_date.tzinfo:
-                            # Convert to Central Time if needed, then get date
-                            visit_date_ct = visit_date.astimezone(ct_tz)
-                            visit_date_only = visit_date_ct.date()
-                        elif hasattr(visit_date, 'date'):
-                            # Naive datetime - assume UTC and convert to CT
-                            visit_date_ct = visit_date.replace(tzinfo=UTC).astimezone(ct_tz)
-                            visit_date_only = visit_date_ct.date()
-                        else:
-                            # Assume it's already a date
-                            visit_date_only = visit_date
+                        visit_date_only = parse_visit_time(visit_date_str).date()
                         
                         # Match with calendar days
-                        for day_date in day_dates:
-                            day_date_only = day_date.date() if hasattr(day_date, 'date') else day_date
-                            if day_date_only == visit_date_only:
-                                day_key = day_date.strftime('%Y-%m-%d')
-                                if day_key not in visits_by_day:
-                                    visits_by_day[day_key] = []
-                                visits_by_day[day_key].append(visit)
-                                break
+                        day_key = date_to_key.get(visit_date_only)
+                        if day_key:
+                            visits_by_day.setdefault(day_key, []).append(visit)
                     except Exception as e:
-                        print(f"Error parsing visit date: {e}")
-                        import traceback
-                        traceback.print_exc()
+                        _log.warning("Error parsing visit date: %s", e)
             
             # Organize visits by day and hour
             visits_by_day_hour = {}
-            visit_id_map = {}  # Map visit IDs to visit objects for button clicks
             for day_key in visits_by_day:
                 visits_by_day_hour[day_key] = {}
                 for visit in visits_by_day[day_key]:
                     visit_time_str = visit.get('scheduledTime', '')
                     try:
-                        if isinstance(visit_time_str, str):
-                            if visit_time_str.endswith('Z'):
-                                visit_time = datetime.fromisoformat(visit_time_str.replace('Z', '+00:00'))
-                            elif '+' in visit_time_str or visit_time_str.endswith('+00:00'):
-                                visit_time = datetime.fromisoformat(visit_time_str)
-                            else:
-                                visit_time = datetime.fromisoformat(visit_time_str)
-                        else:
-                            visit_time = visit_time_str
+                        visit_time = parse_visit_time(visit_time_str)
                         
-                        # Handle timezone conversion
-                        ct_tz = gettz('America/Chicago')
-                        if hasattr(visit_time, 'tzinfo') and visit_time.tzinfo:
-                            # Has timezone info, convert to CT
-                            visit_time = visit_time.astimezone(ct_tz)
-                        else:
-                            # Naive datetime - assume it's UTC and convert to CT
-                            visit_time = visit_time.replace(tzinfo=UTC).astimezone(ct_tz)
+                        # Precompute display fields once so rendering is just string assembly
+                        car_listing = visit.get('carListing') or {}
+                        car_info = f"{car_listing.get('year', '')} {car_listing.get('make', '')} {car_listing.get('model', '')}".strip()
+                        visit['_time_str'] = visit_time.strftime('%I:%M %p')
+                        visit['_car_info'] = (car_info or "Visit")[:15]
                         
                         hour = visit_time.hour
                         if hour not in visits_by_day_hour[day_key]:
                             visits_by_day_hour[day_key][hour] = []
                         visits_by_day_hour[day_key][hour].append(visit)
-                        visit_id_map[str(visit.get('_id', ''))] = visit
                     except Exception as e:
-                        print(f"Error organizing visit by hour: {e}")
+                        _log.warning("Error organizing visit by hour: %s", e)
             
             # Generate calendar HTML
-            calendar_html = '<div class="calendar-container">'
+            parts = ['<div class="calendar-container">']
+            append = parts.append
             
             # Header row
-            calendar_html += '<div class="calendar-header">'
-            calendar_html += '<div class="calendar-header-cell"></div>'  # Time column header
-            for day_name, day_date in zip(days, day_dates):
+            append(_CALENDAR_HEADER_OPEN)  # Includes the empty time column header
+            for day_name, day_date in zip(_DAY_NAMES, day_dates):
                 is_today = day_date.date() == today.date()
                 day_label = f"{day_name}<br>{day_date.strftime('%m/%d')}"
                 if is_today:
                     day_label = f"{day_name}<br>{day_date.strftime('%m/%d')} (Today)"
-                calendar_html += f'<div class="calendar-header-cell">{day_label}</div>'
-            calendar_html += '</div>'
+                append(f'<div class="calendar-header-cell">{day_label}</div>')
+            append(_DIV_CLOSE)
             
             # Hour rows (9 AM to 6 PM)
-            for hour in range(9, 19):  # 9 AM to 6 PM
-                hour_display = f"{hour % 12 or 12}{'AM' if hour < 12 else 'PM'}"
-                calendar_html += '<div class="calendar-row">'
-                calendar_html += f'<div class="calendar-time-cell">{hour_display}</div>'
+            for hour, row_head in zip(_CALENDAR_HOURS, _HOUR_ROW_HEADS):
+                append(row_head)
+                
+                # Empty week - emit the blank row without per-cell lookups
+                if not visits_by_day_hour:
+                    append(_EMPTY_DAY_CELLS)
+                    append(_DIV_CLOSE)
+                    continue
                 
                 for day_date in day_dates:
                     day_key = day_date.strftime('%Y-%m-%d')
                     day_visits = visits_by_day_hour.get(day_key, {}).get(hour, [])
                     
-                    calendar_html += '<div class="calendar-day-cell">'
-                    for visit in day_visits:
-                        visit_time_str = visit.get('scheduledTime', '')
-                        try:
-                            if isinstance(visit_time_str, str):
-                                if visit_time_str.endswith('Z'):
-                                    visit_time = datetime.fromisoformat(visit_time_str.replace('Z', '+00:00'))
-                                elif '+' in visit_time_str or visit_time_str.endswith('+00:00'):
-                                    visit_time = datetime.fromisoformat(visit_time_str)
-                                else:
-                                    visit_time = datetime.fromisoformat(visit_time_str)
-                            else:
-                                visit_time = visit_time_str
-                            
-                            # Handle timezone conversion
-                            ct_tz = gettz('America/Chicago')
-                            if hasattr(visit_time, 'tzinfo') and visit_time.tzinfo:
-                                # Has timezone info, convert to CT
-                                visit_time = visit_time.astimezone(ct_tz)
-                            else:
-                                # Naive datetime - assume it's UTC and convert to CT
-                                from dateutil.tz import UTC
-                                visit_time = visit_time.replace(tzinfo=UTC).astimezone(ct_tz)
-                            
-                            time_str = visit_time.strftime('%I:%M %p') if hasattr(visit_time, 'strftime') else str(visit_time)
-                            
-                            car_listing = visit.get('carListing', {})
-                            car_info = ""
-                            if car_listing:
-                                year = car_listing.get('year', '')
-                                make = car_listing.get('make', '')
-                                model = car_listing.get('model', '')
-                                car_info = f"{year} {make} {model}".strip()
-                            
-                            if not car_info:
-                                car_info = "Visit"
-                            
-                            visit_id = str(visit.get('_id', ''))
-                            visit_key = f"visit_{visit_id}"
-                            # Create clickable visit item with onclick handler
-                            calendar_html += f'<div class="visit-item" data-visit-id="{visit_id}" onclick="selectVisit(\'{visit_id}\')">{time_str}<br>{car_info[:15]}</div>'
-                        except Exception as e:
-                            print(f"Error displaying visit: {e}")
-                    calendar_html += '</div>'
+                    append(_DAY_CELL_OPEN)
+                    # Create clickable visit items (clicks are handled by the calendar component)
+                    append("".join(
+                        _VISIT_ITEM_TMPL.format(visit.get('_id', ''), visit['_time_str'], visit['_car_info'])
+                        for visit in day_visits
+                    ))
+                    append(_DIV_CLOSE)
                 
-                calendar_html += '</div>'
-            
-            calendar_html += '</div>'
-            
-            # Store visit mapping in session state
-            st.session_state.visit_id_map = visit_id_map
+                append(_DIV_CLOSE)
             
-            # Display calendar
-            st.markdown(calendar_html, unsafe_allow_html=True)
+            append(_DIV_CLOSE)
+            calendar_html = ''.join(parts)
             
-            # Add JavaScript to handle visit clicks and store in session state
-            st.markdown("""
-            <script>
-                function selectVisit(visitId) {
-                    // Store visit ID in a hidden input that Streamlit can read
-                    const input = document.createElement('input');
-                    input.type = 'hidden';
-                    input.id = 'selected_visit_id';
-                    input.value = visitId;
-                    // Remove existing if any
-                    const existing = document.getElementById('selected_visit_id');
-                    if (existing) existing.remove();
-                    document.body.appendChild(input);
-                    // Trigger a form submission or use Streamlit's communication
-                    window.parent.postMessage({
-                        type: 'streamlit:setFrameHeight',
-                        height: document.body.scrollHeight
-                    }, '*');
-                }
-            </script>
-            """, unsafe_allow_html=True)
+            # Display calendar; returns {visitId, clickedAt} for the last visit clicked
+            selection = _visit_calendar(html=calendar_html, key="visit_calendar", default=None)
             
-            # Check for selected visit in session state (set by JavaScript)
-            # Use query params as a workaround
-            if 'selected_visit_id' in st.session_state:
-                visit_id = st.session_state.selected_visit_id
-                if visit_id in visit_id_map:
-                    st.session_state.selected_visit = visit_id_map[visit_id]
-                    del st.session_state.selected_visit_id
-                    st.rerun()
+            # Open the clicked visit (clickedAt distinguishes a new click from a rerun)
+            if selection and selection.get("clickedAt") != st.session_state.get("calendar_clicked_at"):
+                st.session_state.calendar_clicked_at = selection.get("clickedAt")
+                st.session_state.selected_visit_id = selection.get("visitId")
             
-            # Modal for visit details
-            if 'selected_visit' in st.session_state and st.session_state.selected_visit:
-                visit = st.session_state.selected_visit
+            # Modal for visit details - resolve the selected ID against this week's cached visits
+            visit_index = {str(v.get('_id', '')): i for i, v in enumerate(visits)}
+            selected_index = visit_index.get(st.session_state.get('selected_visit_id'))
+            if selected_index is not None:
+                visit = visits[selected_index]
                 
                 # Create modal using streamlit's dialog
                 with st.container():
@@ -747,30 +788,13 @@ if page == "Home":
                     # Visit time
                     visit_time_str = visit.get('scheduledTime', '')
                     try:
-                        if isinstance(visit_time_str, str):
-                            # Handle ISO format with or without timezone
-                            if visit_time_str.endswith('Z'):
-                                visit_time = datetime.fromisoformat(visit_time_str.replace('Z', '+00:00'))
-                            elif '+' in visit_time_str or visit_time_str.endswith('+00:00'):
-                                visit_time = datetime.fromisoformat(visit_time_str)
-                            else:
-                                visit_time = datetime.fromisoformat(visit_time_str)
-                        else:
-                            visit_time = visit_time_str
-                        
                         # Convert to Central Time for display
-                        ct_tz = gettz('America/Chicago')
-                        if hasattr(visit_time, 'tzinfo') and visit_time.tzinfo:
-                            visit_time = visit_time.astimezone(ct_tz)
-                        else:
-                            # Naive datetime - assume UTC and convert to CT
-                            from dateutil.tz import UTC
-                            visit_time = visit_time.replace(tzinfo=UTC).astimezone(ct_tz)
+                        visit_time = parse_visit_time(visit_time_str)
                         
                         time_display = visit_time.strftime('%A, %B %d, %Y at %I:%M %p') if hasattr(visit_time, 'strftime') else str(visit_time)
                     except Exception as e:
                         time_display = str(visit_time_str)
-                        print(f"Error formatting visit time: {e}")
+                        _log.warning("Error formatting visit time: %s", e)
                     
                     st.markdown(f"**Scheduled Time:** {time_display} Central Time")
                     
@@ -811,12 +835,11 @@ if page == "Home":
                     
                     # Close button
                     if st.button("Close", key="close_visit_modal"):
-                        del st.session_state.selected_visit
+                        del st.session_state.selected_visit_id
                         st.rerun()
         except Exception as e:
             st.error(f"Error loading visits: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            _log.exception("Error loading visits")
     else:
         st.info("Connect to the API to view scheduled visits.")
     
@@ -831,15 +854,14 @@ elif page == "Listings":
     listings = []
     valid_listings = []
     try:
-        response = requests.get(f"{API_BASE_URL}/car-listings", timeout=5)
-        if response.status_code == 200:
-            listings = response.json()
-            # Filter out listings without miles or listingPrice
-            valid_listings = [l for l in listings if l.get('miles') is not None and l.get('listingPrice') is not None]
-        elif response.status_code == 503:
+        listings = fetch_all_listings()
+        # Only listings with both miles and price can be plotted
+        valid_listings = [l for l in listings if l.get('miles') is not None and l.get('listingPrice') is not None]
+    except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 503:
             st.error("Database unavailable. Please check your MongoDB connection.")
         else:
-            st.error(f"Failed to fetch car listings (Status: {response.status_code})")
+            st.error(f"Failed to fetch car listings (Status: {e.response.status_code})")
     except requests.exceptions.ConnectionError:
         st.error(f"❌ Connection refused. Is the backend running on port {API_PORT}?")
     except requests.exceptions.Timeout:
@@ -850,98 +872,29 @@ elif page == "Listings":
     if listings:
         # Show all listings in a table
         st.markdown("### All Listings")
-        display_listings = []
-        for listing in listings:
-            display_listings.append({
-                "Year": listing.get('year', 'N/A'),
-                "Make": listing.get('make', 'N/A'),
-                "Model": listing.get('model', 'N/A'),
-                "Miles": f"{listing.get('miles', 0):,}" if listing.get('miles') else 'N/A',
-                "Price": f"${listing.get('listingPrice', 0):,}" if listing.get('listingPrice') else 'N/A',
-                "Phone": format_phone_number(listing.get('phoneNumber', 'N/A')),
-                "Complete": "✅" if listing.get('conversationComplete') else "⏳"
-            })
-        
-        if display_listings:
-            st.dataframe(display_listings, use_container_width=True, hide_index=True)
+        table = pa.table({
+            "Year": [l.get('year') for l in listings],
+            "Make": [l.get('make') or 'N/A' for l in listings],
+            "Model": [l.get('model') or 'N/A' for l in listings],
+            "Miles": [l.get('miles') for l in listings],
+            "Price": [l.get('listingPrice') for l in listings],
+            "Phone": [format_phone_number(l.get('phoneNumber') or 'N/A') for l in listings],
+            "Complete": ["✅" if l.get('conversationComplete') else "⏳" for l in listings],
+        })
+        st.dataframe(table, use_container_width=True, hide_index=True, column_config=_LISTING_COLUMN_CONFIG)
         
         # Show scatter plot for valid listings
         if valid_listings:
             st.markdown("### Price vs Miles Visualization")
-            import plotly.graph_objects as go
-            
-            x_data = [l.get('miles', 0) for l in valid_listings]
-            y_data = [l.get('listingPrice', 0) for l in valid_listings]
-            
-            # Create hover text
-            hover_texts = []
-            for listing in valid_listings:
-                miles = listing.get('miles')
-                price = listing.get('listingPrice')
-                doc_fee = listing.get('docFeeQuoted')
-                lowest_price = listing.get('lowestPrice')
-                
-                hover_text = f"Make: {listing.get('make', 'N/A')}<br>"
-                hover_text += f"Model: {listing.get('model', 'N/A')}<br>"
-                hover_text += f"Year: {listing.get('year', 'N/A')}<br>"
-                hover_text += f"Miles: {miles:,}<br>" if miles is not None else "Miles: N/A<br>"
-                hover_text += f"Price: ${price:,}<br>" if price is not None else "Price: N/A<br>"
-                hover_text += f"Tires: {'Yes' if listing.get('tireLifeLeft') else 'No' if listing.get('tireLifeLeft') is not None else 'N/A'}<br>"
-                hover_text += f"Title: {listing.get('titleStatus', 'N/A')}<br>"
-                hover_text += f"Carfax: {listing.get('carfaxDamageIncidents', 'N/A')}<br>"
-                hover_text += f"Doc Fee: ${doc_fee:,}<br>" if doc_fee is not None else "Doc Fee: N/A<br>"
-                hover_text += f"Lowest Price: ${lowest_price:,}<br>" if lowest_price is not None else "Lowest Price: N/A<br>"
-                hover_text += f"Phone: {listing.get('phoneNumber', 'N/A')}"
-                hover_texts.append(hover_text)
-            
-            fig = go.Figure()
-            
-            fig.add_trace(go.Scatter(
-                x=x_data,
-                y=y_data,
-                mode='markers',
-                marker=dict(
-                    size=12,
-                    color='#007bff',
-                    line=dict(width=2, color='#0056b3')
-                ),
-                text=hover_texts,
-                hoverinfo='text',
-                name='Cars'
-            ))
-            
-            fig.update_layout(
-                title="Car Listings: Price vs Miles",
-                xaxis_title="Number of Miles",
-                yaxis_title="Listing Price ($)",
-                height=600,
-                hovermode='closest',
-                margin=dict(l=80, r=20, t=50, b=60),
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                xaxis=dict(
-                    title_font=dict(color='#212529', size=14),
-                    tickfont=dict(color='#212529', size=12),
-                    showline=True,
-                    linecolor='#212529',
-                    linewidth=1
-                ),
-                yaxis=dict(
-                    title_font=dict(color='#212529', size=14),
-                    tickfont=dict(color='#212529', size=12),
-                    showline=True,
-                    linecolor='#212529',
-                    linewidth=1
-                ),
-                title_font=dict(color='#212529')
-            )
-            
+            fig = build_scatter_figure(_listings_fingerprint(valid_listings), valid_listings)
             st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("No car listings yet. Complete conversations to see listings here.")
     
     # Auto-refresh button
     if st.button("Refresh"):
+        fetch_all_listings.clear()
+        build_scatter_figure.clear()
         st.rerun()
     
     # Auto-refresh every 10 seconds (commented out to avoid constant refreshing)
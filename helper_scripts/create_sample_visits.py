@@ -13,6 +13,9 @@ from bson import ObjectId
 
 load_dotenv()
 
+# Central Time zone; parsed once at import
+_CT_TZ = gettz('America/Chicago')
+
 def get_next_saturday_sunday():
     """Get the next Saturday and Sunday dates"""
     today = datetime.now()
@@ -30,12 +33,8 @@ def create_sample_visits():
     # Get Saturday and Sunday dates
     saturday, sunday = get_next_saturday_sunday()
     
-    # Set Central Time timezone
-    ct_tz = gettz('America/Chicago')
-    
     # Get existing threads to link visits to
-    all_threads = Thread.find(sort=[("lastMessageTime", -1)])
-    threads = all_threads[:3] if all_threads else []
+    threads = list(Thread.find(sort=[("lastMessageTime", -1)], limit=3))
     
     if not threads:
         print("⚠️  No threads found. Creating visits without thread association.")
@@ -51,75 +50,44 @@ def create_sample_visits():
             dealer_phones.append(dealer_phones[-1] if dealer_phones else "+15551234567")
     
     # Get car listings if available
-    all_car_listings = CarListing.find(sort=[("extractedAt", -1)])
-    car_listings = all_car_listings[:3] if all_car_listings else []
+    car_listings = list(CarListing.find_raw(sort=[("extractedAt", -1)], limit=3))
     car_listing_ids = [listing["_id"] for listing in car_listings] if car_listings else [None, None, None]
     # Extend if needed
     while len(car_listing_ids) < 3:
         car_listing_ids.append(car_listing_ids[-1] if car_listing_ids and car_listing_ids[-1] else None)
     
-    # Create visits
+    # Create visits: (day, day label, hour, minute, time label, notes)
+    visit_specs = [
+        (saturday, "Saturday", 10, 0, "10:00 AM", "First visit - test drive scheduled"),
+        (saturday, "Saturday", 14, 30, "2:30 PM", "Second visit - inspection and negotiation"),
+        (sunday, "Sunday", 11, 0, "11:00 AM", "Sunday visit - final decision meeting"),
+    ]
+    now = datetime.now()
+    payload = []
+    
+    for i, (day, day_label, hour, minute, time_label, notes) in enumerate(visit_specs):
+        scheduled_time = datetime(day.year, day.month, day.day, hour, minute, tzinfo=_CT_TZ)
+        
+        visit_data = {
+            "threadId": thread_ids[i],
+            "scheduledTime": scheduled_time,
+            "dealerPhoneNumber": dealer_phones[i],
+            "status": "scheduled",
+            "createdAt": now,
+            "updatedAt": now
+        }
+        if car_listing_ids[i]:
+            visit_data["carListingId"] = car_listing_ids[i]
+        visit_data["notes"] = notes
+        
+        payload.append(visit_data)
+    
+    # Insert all visits in one round-trip
+    visit_ids = Visit.create_many(payload)
     visits_created = []
-    
-    # Visit 1: Saturday at 10:00 AM
-    saturday_10am = saturday.replace(hour=10, minute=0, second=0, microsecond=0)
-    saturday_10am = saturday_10am.replace(tzinfo=ct_tz)
-    
-    visit1_data = {
-        "threadId": thread_ids[0],
-        "scheduledTime": saturday_10am,
-        "dealerPhoneNumber": dealer_phones[0],
-        "status": "scheduled",
-        "createdAt": datetime.now(),
-        "updatedAt": datetime.now()
-    }
-    if car_listing_ids[0]:
-        visit1_data["carListingId"] = car_listing_ids[0]
-    visit1_data["notes"] = "First visit - test drive scheduled"
-    
-    visit1_id = Visit.create(visit1_data)
-    visits_created.append(("Saturday 10:00 AM", visit1_id))
-    print(f"✅ Created visit 1: Saturday {saturday_10am.strftime('%B %d, %Y at %I:%M %p')} CT")
-    
-    # Visit 2: Saturday at 2:30 PM
-    saturday_230pm = saturday.replace(hour=14, minute=30, second=0, microsecond=0)
-    saturday_230pm = saturday_230pm.replace(tzinfo=ct_tz)
-    
-    visit2_data = {
-        "threadId": thread_ids[1] if len(thread_ids) > 1 else thread_ids[0],
-        "scheduledTime": saturday_230pm,
-        "dealerPhoneNumber": dealer_phones[1] if len(dealer_phones) > 1 else dealer_phones[0],
-        "status": "scheduled",
-        "createdAt": datetime.now(),
-        "updatedAt": datetime.now()
-    }
-    if car_listing_ids[1]:
-        visit2_data["carListingId"] = car_listing_ids[1]
-    visit2_data["notes"] = "Second visit - inspection and negotiation"
-    
-    visit2_id = Visit.create(visit2_data)
-    visits_created.append(("Saturday 2:30 PM", visit2_id))
-    print(f"✅ Created visit 2: Saturday {saturday_230pm.strftime('%B %d, %Y at %I:%M %p')} CT")
-    
-    # Visit 3: Sunday at 11:00 AM
-    sunday_11am = sunday.replace(hour=11, minute=0, second=0, microsecond=0)
-    sunday_11am = sunday_11am.replace(tzinfo=ct_tz)
-    
-    visit3_data = {
-        "threadId": thread_ids[2] if len(thread_ids) > 2 else thread_ids[0],
-        "scheduledTime": sunday_11am,
-        "dealerPhoneNumber": dealer_phones[2] if len(dealer_phones) > 2 else dealer_phones[0],
-        "status": "scheduled",
-        "createdAt": datetime.now(),
-        "updatedAt": datetime.now()
-    }
-    if car_listing_ids[2]:
-        visit3_data["carListingId"] = car_listing_ids[2]
-    visit3_data["notes"] = "Sunday visit - final decision meeting"
-    
-    visit3_id = Visit.create(visit3_data)
-    visits_created.append(("Sunday 11:00 AM", visit3_id))
-    print(f"✅ Created visit 3: Sunday {sunday_11am.strftime('%B %d, %Y at %I:%M %p')} CT")
+    for i, ((_, day_label, _, _, time_label, _), visit_data, visit_id) in enumerate(zip(visit_specs, payload, visit_ids)):
+        visits_created.append((f"{day_label} {time_label}", visit_id))
+        print(f"✅ Created visit {i + 1}: {day_label} {visit_data['scheduledTime'].strftime('%B %d, %Y at %I:%M %p')} CT")
     
     print(f"\n✅ Successfully created {len(visits_created)} sample visits!")
     print("\nVisits created:")
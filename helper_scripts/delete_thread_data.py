@@ -10,14 +10,14 @@ Script to delete all data associated with a phone number:
 import sys
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to Python path so we can import models
 script_dir = Path(__file__).parent
 project_root = script_dir.parent
 sys.path.insert(0, str(project_root))
 
-from bson import ObjectId
-from models import Thread, Message, CarListing, Visit
+from models import Thread, messages_collection, car_listings_collection, visits_collection, threads_collection
 
 def delete_thread_data(phone_number: str):
     """Delete all data for a given phone number"""
@@ -40,33 +40,24 @@ def delete_thread_data(phone_number: str):
     print(f"   Last message: {thread.get('lastMessage', 'N/A')[:50]}...")
     print(f"   Last message time: {thread.get('lastMessageTime', 'N/A')}")
     
-    # Count and delete messages
-    messages = Message.find({"threadId": thread_id})
-    message_count = len(messages)
-    print(f"\n📨 Found {message_count} messages")
+    # Delete messages, car listing and visits concurrently; the thread goes last so a failed
+    # child delete leaves it in place and the script can be re-run for the same phone number
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        messages_future = executor.submit(messages_collection.delete_many, {"threadId": thread_id})
+        car_listing_future = executor.submit(car_listings_collection.find_one_and_delete, {"threadId": thread_id})
+        visits_future = executor.submit(visits_collection.delete_many, {"threadId": thread_id})
     
-    if message_count > 0:
-        from models import messages_collection
-        result = messages_collection.delete_many({"threadId": thread_id})
-        print(f"   ✅ Deleted {result.deleted_count} messages")
+    message_count = messages_future.result().deleted_count
+    print(f"\n📨 Deleted {message_count} messages")
     
-    # Delete car listing if exists
-    car_listing = CarListing.find_one({"threadId": thread_id})
+    car_listing = car_listing_future.result()
     if car_listing:
-        from models import car_listings_collection
-        result = car_listings_collection.delete_one({"_id": car_listing["_id"]})
         print(f"   ✅ Deleted car listing: {car_listing.get('make', '')} {car_listing.get('model', '')}")
     
-    # Delete visits if exist
-    visits = Visit.find({"threadId": thread_id})
-    visit_count = len(visits)
+    visit_count = visits_future.result().deleted_count
     if visit_count > 0:
-        from models import visits_collection
-        result = visits_collection.delete_many({"threadId": thread_id})
-        print(f"   ✅ Deleted {result.deleted_count} visits")
+        print(f"   ✅ Deleted {visit_count} visits")
     
-    # Finally, delete the thread
-    from models import threads_collection
     result = threads_collection.delete_one({"_id": thread_id})
     
     if result.deleted_count > 0:
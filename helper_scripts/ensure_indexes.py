@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Script to create the MongoDB indexes used by the app and backend.
+Safe to run repeatedly - existing indexes are left as they are.
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to Python path so we can import models
+script_dir = Path(__file__).parent
+project_root = script_dir.parent
+sys.path.insert(0, str(project_root))
+
+from models import ensure_indexes
+
+if __name__ == "__main__":
+    try:
+        ensure_indexes()
+        print("✅ Indexes ensured")
+    except Exception as e:
+        print(f"❌ Error creating indexes: {e}")
+        sys.exit(1)
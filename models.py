@@ -1,33 +1,33 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import OperationFailure
+from pymongo.cursor import Cursor
+from pymongo.command_cursor import CommandCursor
 from bson import ObjectId
-from datetime import datetime
-from typing import Optional, Dict, Any
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional, Dict, Any, List
 import os
-from urllib.parse import urlparse
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-
-def _get_db_name(uri: str) -> str:
-  """
-  Extract a database name from a Mongo URI. Fallback to 'test' if missing.
-  This avoids pymongo InvalidName when the URI omits the db segment.
-  """
-  try:
-    parsed = urlparse(uri)
-    # path starts with "/" if present
-    path = parsed.path or ''
-    name = path.lstrip('/').split('/')[0].split('?')[0]
-    return name or 'test'
-  except Exception:
-    return 'test'
-
-
 # MongoDB connection
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/test')
-client = MongoClient(MONGODB_URI)
-db_name = _get_db_name(MONGODB_URI)
+# Per-process pool size; with several server workers the total is workers x MONGO_POOL
+MONGO_POOL = int(os.getenv('MONGO_POOL', 50))
+
+# One client per process, shared by every model; waiting for a free connection
+# fails fast instead of queueing requests indefinitely when the pool is exhausted
+client = MongoClient(
+    MONGODB_URI,
+    maxPoolSize=MONGO_POOL,
+    minPoolSize=min(5, MONGO_POOL),
+    waitQueueTimeoutMS=1000,
+    serverSelectionTimeoutMS=3000
+)
 # Force use 'test' database
 db = client['test']
 
@@ -36,18 +36,66 @@ threads_collection = db.threads
 messages_collection = db.messages
 car_listings_collection = db.carlistings
 visits_collection = db.visits
+scrape_cache_collection = db.scrapecache
+
+# Read-only handle whose documents decode fields lazily on access
+car_listings_raw_collection = db.get_collection(
+    "carlistings", codec_options=CodecOptions(document_class=RawBSONDocument)
+)
+
+
+# How long a persisted listing scrape stays reusable
+SCRAPE_CACHE_TTL_SECONDS = 3600
+
+
+def ensure_indexes():
+    """Create the collection indexes (no-op for indexes that already exist)"""
+    try:
+        threads_collection.create_index([("phoneNumber", 1)], unique=True)
+    except OperationFailure as e:
+        # An existing non-unique phoneNumber index (or duplicate threads) has to be cleaned up by hand
+        print(f"⚠️  Could not create unique phoneNumber index on threads: {e}")
+    threads_collection.create_index([("lastMessageTime", -1)])
+    messages_collection.create_index([("threadId", 1), ("timestamp", 1)])
+    messages_collection.create_index([("timestamp", 1)])
+    car_listings_collection.create_index([("threadId", 1)], unique=True)
+    car_listings_collection.create_index([("phoneNumber", 1)])
+    car_listings_collection.create_index([("conversationComplete", 1)])
+    visits_collection.create_index([("threadId", 1)])
+    visits_collection.create_index([("status", 1), ("scheduledTime", 1)])
+    visits_collection.create_index([("dealerPhoneNumber", 1)])
+    # Let MongoDB expire cached scrapes on its own
+    scrape_cache_collection.create_index([("createdAt", 1)], expireAfterSeconds=SCRAPE_CACHE_TTL_SECONDS)
+
+
+# Index creation costs a round-trip per index, so only run it on import when asked
+if os.getenv('ENSURE_INDEXES') == '1':
+    ensure_indexes()
+
+
+# find_by_id results are cached per id; entries expire when the time bucket rolls over,
+# which also covers writes made by other processes (Streamlit app, helper scripts)
+_BY_ID_CACHE_TTL_SECONDS = 60
+
 
-# Create indexes
-threads_collection.create_index([("phoneNumber", 1)])
-threads_collection.create_index([("lastMessageTime", -1)])
-messages_collection.create_index([("threadId", 1)])
-messages_collection.create_index([("timestamp", 1)])
-car_listings_collection.create_index([("threadId", 1)], unique=True)
-car_listings_collection.create_index([("phoneNumber", 1)])
-car_listings_collection.create_index([("conversationComplete", 1)])
-visits_collection.create_index([("threadId", 1)])
-visits_collection.create_index([("scheduledTime", 1)])
-visits_collection.create_index([("dealerPhoneNumber", 1)])
+def _ttl_bucket() -> int:
+    return int(time.monotonic() // _BY_ID_CACHE_TTL_SECONDS)
+
+
+@lru_cache(maxsize=2048)
+def _find_thread_by_id(thread_id: str, _bucket: int) -> Optional[Dict[str, Any]]:
+    try:
+        return threads_collection.find_one({"_id": ObjectId(thread_id)})
+    except:
+        return None
+
+
+@lru_cache(maxsize=2048)
+def _find_car_listing_by_id(car_listing_id: str, _bucket: int) -> Optional[Dict[str, Any]]:
+    try:
+        return car_listings_collection.find_one({"_id": ObjectId(car_listing_id)})
+    except:
+        return None
 
 
 class Thread:
@@ -56,37 +104,58 @@ class Thread:
         return threads_collection.find_one(query)
     
     @staticmethod
-    def find(query: Dict[str, Any] = None, sort: list = None) -> list:
+    def find(query: Dict[str, Any] = None, sort: list = None, limit: int = None) -> Cursor:
         cursor = threads_collection.find(query or {})
         if sort:
             cursor = cursor.sort(sort)
-        return list(cursor)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+    
+    @staticmethod
+    def count(query: Dict[str, Any] = None) -> int:
+        return threads_collection.count_documents(query or {})
     
     @staticmethod
     def create(data: Dict[str, Any]) -> str:
         result = threads_collection.insert_one(data)
+        _find_thread_by_id.cache_clear()
         return str(result.inserted_id)
     
     @staticmethod
     def update_one(query: Dict[str, Any], update: Dict[str, Any]):
-        return threads_collection.update_one(query, {"$set": update})
+        result = threads_collection.update_one(query, {"$set": update})
+        _find_thread_by_id.cache_clear()
+        return result
+    
+    @staticmethod
+    def find_one_and_update(query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> Optional[Dict[str, Any]]:
+        """Apply a raw update document and return the updated thread"""
+        thread = threads_collection.find_one_and_update(
+            query, update, upsert=upsert, return_document=ReturnDocument.AFTER
+        )
+        _find_thread_by_id.cache_clear()
+        return thread
     
     @staticmethod
     def find_by_id(thread_id: str) -> Optional[Dict[str, Any]]:
-        from bson import ObjectId
-        try:
-            return threads_collection.find_one({"_id": ObjectId(thread_id)})
-        except:
-            return None
+        """Cached lookup (see _BY_ID_CACHE_TTL_SECONDS); treat the result as read-only"""
+        return _find_thread_by_id(str(thread_id), _ttl_bucket())
 
 
 class Message:
     @staticmethod
-    def find(query: Dict[str, Any], sort: list = None) -> list:
-        cursor = messages_collection.find(query)
+    def find(query: Dict[str, Any], sort: list = None, limit: int = None, projection: Dict[str, Any] = None) -> Cursor:
+        cursor = messages_collection.find(query, projection)
         if sort:
             cursor = cursor.sort(sort)
-        return list(cursor)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+    
+    @staticmethod
+    def count(query: Dict[str, Any] = None) -> int:
+        return messages_collection.count_documents(query or {})
     
     @staticmethod
     def create(data: Dict[str, Any]) -> str:
@@ -100,27 +169,57 @@ class CarListing:
         return car_listings_collection.find_one(query)
     
     @staticmethod
-    def find(query: Dict[str, Any] = None, sort: list = None) -> list:
+    def find(query: Dict[str, Any] = None, sort: list = None, limit: int = None) -> Cursor:
         cursor = car_listings_collection.find(query or {})
         if sort:
             cursor = cursor.sort(sort)
-        return list(cursor)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+    
+    @staticmethod
+    def find_with_thread(query: Dict[str, Any] = None, sort: list = None, limit: int = None) -> CommandCursor:
+        """Find listings with their thread embedded under "thread" (via $lookup, one round-trip)"""
+        pipeline = [{"$match": query or {}}]
+        if sort:
+            pipeline.append({"$sort": dict(sort)})
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline += [
+            {"$lookup": {"from": "threads", "localField": "threadId", "foreignField": "_id", "as": "thread"}},
+            {"$unwind": {"path": "$thread", "preserveNullAndEmptyArrays": True}}
+        ]
+        return car_listings_collection.aggregate(pipeline)
+    
+    @staticmethod
+    def find_raw(query: Dict[str, Any] = None, sort: list = None, limit: int = None) -> Cursor:
+        cursor = car_listings_raw_collection.find(query or {})
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+    
+    @staticmethod
+    def count(query: Dict[str, Any] = None) -> int:
+        return car_listings_collection.count_documents(query or {})
     
     @staticmethod
     def create(data: Dict[str, Any]) -> str:
         result = car_listings_collection.insert_one(data)
+        _find_car_listing_by_id.cache_clear()
         return str(result.inserted_id)
     
     @staticmethod
     def update_one(query: Dict[str, Any], update: Dict[str, Any]):
-        return car_listings_collection.update_one(query, {"$set": update})
+        result = car_listings_collection.update_one(query, {"$set": update})
+        _find_car_listing_by_id.cache_clear()
+        return result
     
     @staticmethod
     def find_by_id(car_listing_id: str) -> Optional[Dict[str, Any]]:
-        try:
-            return car_listings_collection.find_one({"_id": ObjectId(car_listing_id)})
-        except:
-            return None
+        """Cached lookup (see _BY_ID_CACHE_TTL_SECONDS); treat the result as read-only"""
+        return _find_car_listing_by_id(str(car_listing_id), _ttl_bucket())
 
 
 class Visit:
@@ -129,24 +228,66 @@ class Visit:
         return visits_collection.find_one(query)
     
     @staticmethod
-    def find(query: Dict[str, Any] = None, sort: list = None) -> list:
+    def find(query: Dict[str, Any] = None, sort: list = None, limit: int = None) -> Cursor:
         cursor = visits_collection.find(query or {})
         if sort:
             cursor = cursor.sort(sort)
-        return list(cursor)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+    
+    @staticmethod
+    def find_with_details(query: Dict[str, Any] = None, sort: list = None, limit: int = None) -> CommandCursor:
+        """Find visits with their car listing and thread embedded under "carListing"/"thread" (one round-trip)"""
+        pipeline = [{"$match": query or {}}]
+        if sort:
+            pipeline.append({"$sort": dict(sort)})
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline += [
+            {"$lookup": {"from": "carlistings", "localField": "carListingId", "foreignField": "_id", "as": "carListing"}},
+            {"$unwind": {"path": "$carListing", "preserveNullAndEmptyArrays": True}},
+            {"$lookup": {"from": "threads", "localField": "threadId", "foreignField": "_id", "as": "thread"}},
+            {"$unwind": {"path": "$thread", "preserveNullAndEmptyArrays": True}},
+            # Visit views only read the dealer's number from the thread; drop the message preview
+            {"$project": {"thread.lastMessage": 0}}
+        ]
+        return visits_collection.aggregate(pipeline)
+    
+    @staticmethod
+    def count(query: Dict[str, Any] = None) -> int:
+        return visits_collection.count_documents(query or {})
+    
+    # Bumped on every write made through this class, so callers can key caches on it
+    _generation = 0
+    
+    @staticmethod
+    def generation() -> int:
+        return Visit._generation
     
     @staticmethod
     def create(data: Dict[str, Any]) -> str:
         result = visits_collection.insert_one(data)
+        Visit._generation += 1
         return str(result.inserted_id)
     
+    @staticmethod
+    def create_many(data: List[Dict[str, Any]]) -> List[str]:
+        result = visits_collection.insert_many(data)
+        Visit._generation += 1
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+    
     @staticmethod
     def update_one(query: Dict[str, Any], update: Dict[str, Any]):
-        return visits_collection.update_one(query, {"$set": update})
+        result = visits_collection.update_one(query, {"$set": update})
+        Visit._generation += 1
+        return result
     
     @staticmethod
     def delete_one(query: Dict[str, Any]):
-        return visits_collection.delete_one(query)
+        result = visits_collection.delete_one(query)
+        Visit._generation += 1
+        return result
     
     @staticmethod
     def find_by_id(visit_id: str) -> Optional[Dict[str, Any]]:
@@ -155,3 +296,20 @@ class Visit:
         except:
             return None
 
+
+class ScrapeCache:
+    """Listing scrape results keyed by a hash of the canonical URL, shared across processes and restarts"""
+    @staticmethod
+    def get(key: str) -> Optional[Dict[str, Any]]:
+        # Age is checked here too, since the TTL monitor only runs about once a minute
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=SCRAPE_CACHE_TTL_SECONDS)
+        entry = scrape_cache_collection.find_one({"_id": key, "createdAt": {"$gte": cutoff}})
+        return entry["data"] if entry else None
+    
+    @staticmethod
+    def set(key: str, data: Dict[str, Any]):
+        return scrape_cache_collection.replace_one(
+            {"_id": key},
+            {"_id": key, "data": data, "createdAt": datetime.now(timezone.utc)},
+            upsert=True
+        )
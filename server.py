@@ -1,28 +1,62 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from fastapi.responses import Response, ORJSONResponse, StreamingResponse
+from typing import Optional, Dict, Any, List, TypedDict
 import os
+import sys
 import asyncio
+import heapq
+import hashlib
+import itertools
 import random
-import re
-import json
-from datetime import datetime
+import time
+import orjson
+from enum import Enum
+from functools import lru_cache
+from datetime import datetime, timezone
 from bson import ObjectId
+from dateutil import parser as date_parser
+from dateutil.tz import gettz
 from dotenv import load_dotenv
 
 from models import Thread, Message, CarListing, Visit
 from utils import (
     build_conversation_transcript,
     extract_car_listing_data, message_contains_new_information, get_ai_response,
-    send_sms, MTA_PHONE_NUMBER, MTA_API_KEY, openai_client,
-    check_if_message_about_visit_scheduling, process_visit_scheduling
+    send_sms, MTA_PHONE_NUMBER, MTA_API_KEY, openai_client, close_openai_clients, http_client, close_browser,
+    check_if_message_about_visit_scheduling, process_visit_scheduling, parse_agent_reply
 )
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Request-path logging goes through a bounded queue drained by a background task that
+# writes in a worker thread, so a slow stdout never blocks the event loop (messages are dropped if it fills up)
+_log_queue: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+
+# Header/body/transcript dumps are only built when LOG_LEVEL=DEBUG
+_DEBUG = os.getenv("LOG_LEVEL", "INFO").upper() == "DEBUG"
+
+
+def log(message: str):
+    try:
+        _log_queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+def _write_log_lines(lines: list):
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+async def _drain_log_queue():
+    while True:
+        lines = [await _log_queue.get()]
+        while not _log_queue.empty():
+            lines.append(_log_queue.get_nowait())
+        await asyncio.to_thread(_write_log_lines, lines)
 
 # CORS middleware
 app.add_middleware(
@@ -33,39 +67,211 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    if request.url.path == "/api/webhook/sms":
-        print(f"\n🌐 INCOMING REQUEST: {request.method} {request.url.path}")
-        print(f"   Client: {request.client.host if request.client else 'unknown'}")
-        print(f"   Headers: {dict(request.headers)}")
+# Request logging middleware (pure ASGI so other routes pass straight through)
+class LogRequestsMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/api/webhook/sms":
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        log(f"\n🌐 INCOMING REQUEST: {scope['method']} {scope['path']}")
+        log(f"   Client: {client[0] if client else 'unknown'}")
+        if _DEBUG:
+            log(f"   Headers: {dict((k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers'])}")
+        
+        body = bytearray()
         try:
-            body_bytes = await request.body()
-            if body_bytes:
-                body_str = body_bytes.decode('utf-8')
-                print(f"   Body: {body_str}")
-                # Recreate the request body for downstream processing
-                async def receive():
-                    return {"type": "http.request", "body": body_bytes}
-                request._receive = receive
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] != "http.request":
+                    break
+                body += message.get("body", b"")
+                more_body = message.get("more_body", False)
+            if body:
+                if _DEBUG:
+                    log(f"   Body: {body.decode('utf-8')}")
+                # Parse once here; the endpoint reads the payload from request.state
+                scope.setdefault("state", {})["sms_payload"] = orjson.loads(body)
         except Exception as e:
-            print(f"   Error reading body: {e}")
-    
-    response = await call_next(request)
-    return response
+            log(f"   Error reading body: {e}")
+        
+        # Replay the buffered body for downstream processing
+        body_sent = False
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": bytes(body), "more_body": False}
+            return await receive()
+        
+        await self.app(scope, replay_receive, send)
+
+
+app.add_middleware(LogRequestsMiddleware)
+
+async def _db(fn, *args, **kwargs):
+    """Run a blocking PyMongo call in a worker thread so it doesn't stall the event loop"""
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+async def _save_outbound_message(thread_id, to: str, body: str, thread_updates: Dict[str, Any], save_message: bool = True):
+    """Save an outbound message and update its thread's last message concurrently"""
+    now = datetime.now(_UTC)
+    writes = [_db(
+        Thread.update_one,
+        {"_id": thread_id},
+        {**thread_updates, "lastMessage": body, "lastMessageTime": now}
+    )]
+    if save_message:
+        writes.append(_db(Message.create, {
+            "threadId": thread_id,
+            "from": MTA_PHONE_NUMBER,
+            "to": to,
+            "body": body,
+            "direction": "outbound",
+            "timestamp": now
+        }))
+    await asyncio.gather(*writes)
+
+
+_UTC = timezone.utc
+_CT_TZ = gettz('America/Chicago')
+
+
+def _parse_iso_timestamp(value: str) -> datetime:
+    """fromisoformat only accepts a trailing 'Z' from Python 3.11, so swap it by slicing"""
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
+
+
+def _ensure_tz(value: datetime) -> datetime:
+    """Treat naive datetimes as Central Time"""
+    return value if value.tzinfo else value.replace(tzinfo=_CT_TZ)
+
+
+@lru_cache(maxsize=256)
+def _parse_date_param(value: str) -> datetime:
+    """Parse a date query param, trying ISO-8601 before dateutil's format guessing"""
+    try:
+        return _parse_iso_timestamp(value)
+    except ValueError:
+        return date_parser.parse(value)
+
+
+# Mobile Text Alerts automatic opt-in confirmation (compared lowercased)
+_OPT_IN_TEXT = "thanks for opting in to receive messages from us!"
+
+# Delayed replies live in one heap of (deadline, seq, thread ID, thread _id, phone, reply) drained by a
+# single scheduler task. pending_responses maps thread ID -> seq of its live reply; popping it cancels.
+pending_responses: Dict[str, int] = {}
+pending_responses_lock = asyncio.Lock()
+_reply_heap: List[tuple] = []
+_reply_seq = itertools.count()
+_reply_wakeup = asyncio.Event()
+_reply_send_tasks = set()
+
+
+async def _reply_scheduler():
+    loop = asyncio.get_running_loop()
+    while True:
+        if not _reply_heap:
+            _reply_wakeup.clear()
+            await _reply_wakeup.wait()
+            continue
+        
+        delay = _reply_heap[0][0] - loop.time()
+        if delay > 0:
+            # Sleep until the earliest deadline, or until a new reply is queued
+            _reply_wakeup.clear()
+            try:
+                await asyncio.wait_for(_reply_wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        
+        _, seq, thread_id_string, thread_oid, sender_phone, reply = heapq.heappop(_reply_heap)
+        async with pending_responses_lock:
+            if pending_responses.get(thread_id_string) != seq:
+                log("⚠️  Response cancelled, not sending")
+                continue
+            del pending_responses[thread_id_string]
+        
+        task = asyncio.create_task(_send_delayed_response(thread_oid, sender_phone, reply))
+        _reply_send_tasks.add(task)
+        task.add_done_callback(_reply_send_tasks.discard)
+
+
+async def _send_delayed_response(thread_oid, sender_phone: str, reply: str):
+    try:
+        # Send AI-generated response
+        await send_sms(sender_phone, reply)
+        
+        # Save outbound message and update thread
+        await _save_outbound_message(thread_oid, sender_phone, reply, {})
+        
+        log("✅ AI agent response sent successfully")
+    except Exception as send_error:
+        log(f"Error sending AI agent response: {send_error}")
 
-# Track pending responses by thread ID
-pending_responses = {}
 
-# Mobile Text Alerts webhook payload model
-class SMSWebhook(BaseModel):
+# Mobile Text Alerts webhook payload (read as a plain dict, no model validation)
+class SMSWebhook(TypedDict, total=False):
     fromNumber: str
-    toNumber: Optional[str] = None
+    toNumber: Optional[str]
     message: str
-    replyId: Optional[str] = None
-    timestamp: Optional[str] = None
-    tags: Optional[Dict[str, Any]] = None
+    replyId: Optional[str]
+    timestamp: Optional[str]
+    tags: Optional[Dict[str, Any]]
+
+
+@app.on_event("startup")
+async def start_log_drain():
+    app.state.log_drain_task = asyncio.create_task(_drain_log_queue())
+
+
+@app.on_event("startup")
+async def warm_mongo_pool():
+    """Open the MongoDB pool before the first request instead of on it"""
+    from models import client
+    try:
+        await _db(client.admin.command, 'ping')
+    except Exception as e:
+        log(f"⚠️  MongoDB not reachable at startup: {e}")
+
+
+@app.on_event("startup")
+async def start_reply_scheduler():
+    app.state.reply_scheduler_task = asyncio.create_task(_reply_scheduler())
+
+
+@app.on_event("shutdown")
+async def stop_reply_scheduler():
+    app.state.reply_scheduler_task.cancel()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+    await close_openai_clients()
+
+
+@app.on_event("shutdown")
+async def close_scrape_browser():
+    await close_browser()
+
+
+@app.on_event("shutdown")
+async def flush_log_queue():
+    app.state.log_drain_task.cancel()
+    while not _log_queue.empty():
+        sys.stdout.write(_log_queue.get_nowait() + "\n")
+    sys.stdout.flush()
 
 
 @app.get("/api")
@@ -76,7 +282,7 @@ async def root():
 @app.get("/api/webhook/test")
 async def webhook_test():
     """Test endpoint to verify webhook URL is reachable"""
-    print("\n🔔 WEBHOOK TEST ENDPOINT HIT - Webhook URL is reachable!")
+    log("\n🔔 WEBHOOK TEST ENDPOINT HIT - Webhook URL is reachable!")
     return {"message": "Webhook endpoint is reachable", "status": "ok"}
 
 
@@ -85,7 +291,7 @@ async def test_db():
     from models import client
     try:
         # Test connection
-        client.admin.command('ping')
+        await _db(client.admin.command, 'ping')
         return {
             "connected": True,
             "state": "connected",
@@ -99,16 +305,39 @@ async def test_db():
         }
 
 
+@app.get("/api/dashboard-summary")
+async def get_dashboard_summary():
+    """Aggregate the dashboard status block into a single round-trip"""
+    from models import client
+
+    def ping():
+        client.admin.command('ping')
+        return True
+
+    db_ok, thread_count, listing_count = await asyncio.gather(
+        asyncio.to_thread(ping),
+        asyncio.to_thread(Thread.count),
+        asyncio.to_thread(CarListing.count),
+        return_exceptions=True
+    )
+
+    return {
+        "api_ok": True,
+        "db_ok": db_ok is True,
+        "thread_count": thread_count if isinstance(thread_count, int) else None,
+        "listing_count": listing_count if isinstance(listing_count, int) else None
+    }
+
+
 @app.get("/api/templates")
 async def get_templates():
-    import requests
     from utils import MTA_API_BASE_URL, MTA_API_KEY
     
     if not MTA_API_KEY:
         raise HTTPException(status_code=500, detail="MTA_API_KEY is not configured in environment variables")
     
     try:
-        response = requests.get(
+        response = await http_client.get(
             f"{MTA_API_BASE_URL}/templates",
             headers={
                 "Authorization": f"Bearer {MTA_API_KEY}",
@@ -126,7 +355,6 @@ async def get_templates():
 
 @app.post("/api/register-webhook")
 async def register_webhook(webhook_data: Dict[str, Any]):
-    import requests
     from utils import MTA_API_BASE_URL, MTA_API_KEY
     
     if not MTA_API_KEY:
@@ -137,7 +365,7 @@ async def register_webhook(webhook_data: Dict[str, Any]):
         raise HTTPException(status_code=400, detail="webhookUrl is required")
     
     try:
-        response = requests.post(
+        response = await http_client.post(
             f"{MTA_API_BASE_URL}/webhooks",
             json={
                 "event": "message-reply",
@@ -160,421 +388,343 @@ async def register_webhook(webhook_data: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=f"Failed to register webhook: {str(e)}")
 
 
+class ReplyState(Enum):
+    REPLY = "reply"        # normal reply, sent after a short delay
+    WAIT = "wait"          # thank the dealer now and wait for them to get back
+    COMPLETE = "complete"  # visit scheduled: confirm now and close the conversation
+
+
+# state -> (_emit flags, whether to save car listing data, webhook result message)
+_REPLY_ACTIONS = {
+    ReplyState.WAIT: ({"waiting": True}, False, "Entered waiting state, no further responses until dealer provides new info"),
+    ReplyState.COMPLETE: ({"complete": True}, True, "Visit scheduled, conversation complete"),
+}
+
+_SCHEDULING_FAILED_REPLY = "I'm ready to schedule a visit. What date and time works for you?"
+
+
+def _scheduling_outcome(scheduling_result, failed_reply: str):
+    """Map a scheduling agent result to (state, reply)"""
+    if scheduling_result and isinstance(scheduling_result, dict):
+        scheduling_message = scheduling_result.get("message", "")
+        if scheduling_result.get("visit_scheduled", False):
+            log(f"✅ Visit scheduled! Scheduling agent response: {scheduling_message}")
+            return ReplyState.COMPLETE, scheduling_message
+        # Agent will keep returning #SCHEDULE# until the visit is scheduled
+        log(f"📅 Scheduling agent response (visit not yet scheduled): {scheduling_message}")
+        return ReplyState.REPLY, scheduling_message
+    if scheduling_result:
+        # Scheduling agent returned a string (backward compatibility)
+        log(f"📅 Scheduling agent response (legacy format): {scheduling_result}")
+        return ReplyState.REPLY, scheduling_result
+    log("⚠️  Scheduling agent failed")
+    return ReplyState.REPLY, failed_reply
+
+
+async def _decide_reply(thread, transcript: str, sender_phone: str, message_body: str):
+    """Run the AI agent (and scheduling agent if needed); returns (state, reply, car listing if fetched)"""
+    thread_id_string = str(thread["_id"])
+    
+    # Always call main AI agent; the visit-intent check runs alongside it since it's independent
+    known_data = None  # No URL extraction data available
+    ai_response, about_visit = await asyncio.gather(
+        get_ai_response(transcript, known_data, thread.get("waitingForDealerResponse", False)),
+        check_if_message_about_visit_scheduling(message_body)
+    )
+    log(f"AI agent response: {ai_response}")
+    
+    reply_text, sentinel = parse_agent_reply(ai_response)
+    if sentinel == "WAITING":
+        log("✅ Agent entering waiting state - dealer said they will get back")
+        return ReplyState.WAIT, reply_text or "Thank you", None
+    
+    # The AI may return just "#SCHEDULE#" or a message with "#SCHEDULE#" appended
+    if sentinel == "SCHEDULE":
+        log("📅 Agent has all information, calling scheduling agent...")
+        log(f"   AI response contained #SCHEDULE#: {ai_response}")
+        # Fetched once; reused by the scheduling agent and when saving the listing on completion
+        car_listing = await _db(CarListing.find_one, {"threadId": thread["_id"]})
+        scheduling_result = await process_visit_scheduling(transcript, thread_id_string, sender_phone, message_body, car_listing)
+        state, reply = _scheduling_outcome(scheduling_result, _SCHEDULING_FAILED_REPLY)
+        return state, reply, car_listing
+    
+    # Dealer is asking about scheduling but the AI didn't return #SCHEDULE# -
+    # if the car listing already has the key fields, try the scheduling agent anyway
+    if about_visit:
+        car_listing = await _db(CarListing.find_one, {"threadId": thread["_id"]})
+        if car_listing and car_listing.get('make') and car_listing.get('model') and car_listing.get('year'):
+            log("📅 Dealer asked about scheduling - checking if we should call scheduling agent...")
+            log(f"   Car listing exists: {car_listing.get('make')} {car_listing.get('model')} {car_listing.get('year')}")
+            scheduling_result = await process_visit_scheduling(transcript, thread_id_string, sender_phone, message_body, car_listing)
+            state, reply = _scheduling_outcome(scheduling_result, ai_response)
+            return state, reply, car_listing
+        log("ℹ️  Dealer asked about scheduling but no complete car listing found, using AI response")
+    
+    return ReplyState.REPLY, ai_response, None
+
+
+async def _emit(thread, sender_phone: str, body: str, *, waiting: bool = False, complete: bool = False):
+    """Send a reply now and record it; a completing conversation is closed even if the send fails"""
+    sent = False
+    try:
+        await send_sms(sender_phone, body)
+        sent = True
+        log("✅ Reply sent to dealer")
+    except Exception as send_error:
+        log(f"Error sending message: {send_error}")
+    
+    thread_updates = {}
+    if waiting:
+        thread_updates["waitingForDealerResponse"] = True
+    if complete:
+        thread_updates["conversationComplete"] = True
+    if sent or complete:
+        await _save_outbound_message(thread["_id"], sender_phone, body, thread_updates, save_message=sent)
+
+
+async def _save_car_listing(thread, sender_phone: str, transcript: str, car_listing=None):
+    """Extract car listing data from the finished conversation and save it"""
+    try:
+        if car_listing is None:
+            car_listing = await _db(CarListing.find_one, {"threadId": thread["_id"]})
+        if car_listing and car_listing.get("conversationComplete"):
+            return
+        
+        extracted_data = await extract_car_listing_data(transcript)
+        log(f"Extracted car listing data: {extracted_data}")
+        
+        if car_listing:
+            await _db(CarListing.update_one,
+                {"threadId": thread["_id"]},
+                {**extracted_data, "conversationComplete": True}
+            )
+            log("✅ Updated existing car listing")
+        else:
+            await _db(CarListing.create, {
+                "threadId": thread["_id"],
+                "phoneNumber": sender_phone,
+                **extracted_data,
+                "conversationComplete": True,
+                "extractedAt": datetime.now(_UTC)
+            })
+            log("✅ Saved car listing data to MongoDB")
+    except Exception as extract_error:
+        log(f"Error extracting/saving car listing data: {extract_error}")
+
+
+async def _schedule_delayed_response(thread, sender_phone: str, ai_response: str):
+    """Queue the reply to be sent after a short delay unless a newer message from the dealer cancels it"""
+    thread_id_string = str(thread["_id"])
+    delay_ms = 3000 # random.randint(30000, 60000)  
+    log(f"⏱️  Scheduling response to be sent in {delay_ms // 1000} seconds")
+    
+    seq = next(_reply_seq)
+    async with pending_responses_lock:
+        pending_responses[thread_id_string] = seq
+    deadline = asyncio.get_running_loop().time() + delay_ms / 1000
+    heapq.heappush(_reply_heap, (deadline, seq, thread_id_string, thread["_id"], sender_phone, ai_response))
+    _reply_wakeup.set()
+
+
+# Per-phone locks so messages from one dealer are handled in order; refcounted so idle entries are dropped
+_phone_locks: Dict[str, asyncio.Lock] = {}
+_phone_lock_users: Dict[str, int] = {}
+
+
 @app.post("/api/webhook/sms")
-async def sms_webhook(webhook: SMSWebhook):
+async def sms_webhook(request: Request):
+    webhook = getattr(request.state, "sms_payload", None)
+    if webhook is None:
+        try:
+            webhook = orjson.loads(await request.body())
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(webhook, dict):
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+    
+    phone = webhook.get("fromNumber")
+    if not isinstance(phone, str):
+        raise HTTPException(status_code=400, detail="Missing required fields")
+    lock = _phone_locks.setdefault(phone, asyncio.Lock())
+    _phone_lock_users[phone] = _phone_lock_users.get(phone, 0) + 1
     try:
-        print(f"\n{'='*60}")
-        print(f"📨 INCOMING WEBHOOK RECEIVED")
-        print(f"{'='*60}")
-        print(f"From: {webhook.fromNumber}")
-        print(f"To: {webhook.toNumber}")
-        print(f"Message: {webhook.message}")
-        print(f"Timestamp: {webhook.timestamp}")
-        print(f"Reply ID: {webhook.replyId}")
-        print(f"Tags: {webhook.tags}")
-        print(f"{'='*60}\n")
-        
-        sender_phone = webhook.fromNumber
-        recipient_phone = webhook.toNumber or "unknown"
-        message_body = webhook.message
-        
-        if not sender_phone or not message_body:
-            print("❌ ERROR: Missing required fields (sender_phone or message_body)")
+        async with lock:
+            return await _handle_sms(webhook)
+    finally:
+        _phone_lock_users[phone] -= 1
+        if not _phone_lock_users[phone]:
+            del _phone_lock_users[phone]
+            del _phone_locks[phone]
+
+
+async def _handle_sms(webhook: SMSWebhook):
+    try:
+        log(f"\n{'='*60}")
+        log(f"📨 INCOMING WEBHOOK RECEIVED")
+        log(f"{'='*60}")
+        log(f"From: {webhook.get('fromNumber')}")
+        log(f"To: {webhook.get('toNumber')}")
+        log(f"Message: {webhook.get('message')}")
+        log(f"Timestamp: {webhook.get('timestamp')}")
+        log(f"Reply ID: {webhook.get('replyId')}")
+        log(f"Tags: {webhook.get('tags')}")
+        log(f"{'='*60}\n")
+        
+        sender_phone = webhook.get("fromNumber")
+        recipient_phone = webhook.get("toNumber") or "unknown"
+        message_body = webhook.get("message")
+        
+        if not sender_phone or not message_body or not isinstance(message_body, str):
+            log("❌ ERROR: Missing required fields (sender_phone or message_body)")
             raise HTTPException(status_code=400, detail="Missing required fields")
         
         # Filter out Mobile Text Alerts automatic opt-in messages
-        opt_in_pattern = re.compile(r'Thanks for opting in to receive messages from us!', re.IGNORECASE)
-        if opt_in_pattern.search(message_body):
-            print("⚠️  Ignoring Mobile Text Alerts automatic opt-in message")
+        if _OPT_IN_TEXT in message_body.lower():
+            log("⚠️  Ignoring Mobile Text Alerts automatic opt-in message")
             return {"success": True, "message": "Opt-in message ignored"}
         
-        # Find or create thread
-        thread = Thread.find_one({"phoneNumber": sender_phone})
-        
-        if not thread:
-            timestamp = datetime.now()
-            if webhook.timestamp:
-                try:
-                    timestamp = datetime.fromisoformat(webhook.timestamp.replace('Z', '+00:00'))
-                except:
-                    timestamp = datetime.now()
-            
-            thread_data = {
-                "phoneNumber": sender_phone,
-                "lastMessage": message_body,
-                "lastMessageTime": timestamp,
-                "unreadCount": 1,
-                "conversationComplete": False,
-                "waitingForDealerResponse": False
-            }
-            thread_id = Thread.create(thread_data)
-            thread = Thread.find_by_id(thread_id)
-        else:
-            timestamp = datetime.now()
-            if webhook.timestamp:
-                try:
-                    timestamp = datetime.fromisoformat(webhook.timestamp.replace('Z', '+00:00'))
-                except:
-                    timestamp = datetime.now()
-            
-            Thread.update_one(
-                {"_id": thread["_id"]},
-                {
-                    "lastMessage": message_body,
-                    "lastMessageTime": timestamp,
-                    "unreadCount": thread.get("unreadCount", 0) + 1
-                }
-            )
-            thread = Thread.find_by_id(str(thread["_id"]))
-        
-        # Save incoming message
-        message_timestamp = datetime.now()
-        if webhook.timestamp:
+        # Parse the webhook timestamp once; used for both the thread and the saved message
+        timestamp = datetime.now(_UTC)
+        if webhook.get("timestamp") and isinstance(webhook["timestamp"], str):
             try:
-                message_timestamp = datetime.fromisoformat(webhook.timestamp.replace('Z', '+00:00'))
-            except:
-                message_timestamp = datetime.now()
+                timestamp = _parse_iso_timestamp(webhook["timestamp"])
+            except ValueError:
+                pass
+        
+        # Find or create thread and record the incoming message in one round-trip
+        thread = await _db(Thread.find_one_and_update,
+            {"phoneNumber": sender_phone},
+            {
+                "$set": {"lastMessage": message_body, "lastMessageTime": timestamp},
+                "$inc": {"unreadCount": 1},
+                "$setOnInsert": {"conversationComplete": False, "waitingForDealerResponse": False}
+            },
+            upsert=True
+        )
         
+        # Save incoming message
         message_data = {
             "threadId": thread["_id"],
             "from": sender_phone,
             "to": recipient_phone,
             "body": message_body,
             "direction": "inbound",
-            "timestamp": message_timestamp,
-            "externalMessageId": webhook.replyId or (webhook.tags.get("messageId") if webhook.tags else None)
+            "timestamp": timestamp,
+            "externalMessageId": webhook.get("replyId") or (webhook["tags"].get("messageId") if webhook.get("tags") else None)
         }
-        Message.create(message_data)
+        await _db(Message.create, message_data)
         
         # Check if conversation is already complete
         if thread.get("conversationComplete"):
-            print("ℹ️  Conversation already complete, not generating response")
+            log("ℹ️  Conversation already complete, not generating response")
             return {"success": True, "message": "Conversation complete, no response sent"}
         
         # If waiting for dealer response, check if message has new information
         if thread.get("waitingForDealerResponse"):
-            print("ℹ️  Currently waiting for dealer response, checking if message contains new information...")
+            log("ℹ️  Currently waiting for dealer response, checking if message contains new information...")
             known_data = None  # No URL extraction data available
             has_new_info = await message_contains_new_information(message_body, known_data)
             
             if not has_new_info:
-                print("ℹ️  Message is just an acknowledgment, not responding")
+                log("ℹ️  Message is just an acknowledgment, not responding")
                 return {"success": True, "message": "Waiting for dealer response, no new information in message"}
             else:
-                print("✅ Message contains new information, clearing waiting state and responding")
-                Thread.update_one(
+                log("✅ Message contains new information, clearing waiting state and responding")
+                await _db(Thread.update_one,
                     {"_id": thread["_id"]},
                     {"waitingForDealerResponse": False}
                 )
         
         # Cancel any pending response for this thread
         thread_id_string = str(thread["_id"])
-        if thread_id_string in pending_responses:
-            pending_timeout = pending_responses[thread_id_string]
-            pending_timeout["task"].cancel()
-            del pending_responses[thread_id_string]
-            print("⚠️  Cancelled pending response due to new message")
+        async with pending_responses_lock:
+            cancelled = pending_responses.pop(thread_id_string, None) is not None
+        if cancelled:
+            log("⚠️  Cancelled pending response due to new message")
         
-        # Generate AI agent response
+        # Generate AI agent response and dispatch on the resulting state
         try:
             transcript = await build_conversation_transcript(thread_id_string, Message)
-            print(f"Conversation transcript: {transcript}")
-            
-            # Always call main AI agent first
-            known_data = None  # No URL extraction data available
-            ai_response = await get_ai_response(transcript, known_data, thread.get("waitingForDealerResponse", False))
-            print(f"AI agent response: {ai_response}")
+            if _DEBUG:
+                log(f"Conversation transcript: {transcript}")
             
-            # Check if we should enter waiting state
-            if "# WAITING #" in ai_response:
-                print("✅ Agent entering waiting state - dealer said they will get back")
-                thank_you_message = ai_response.replace("# WAITING #", "").strip() or "Thank you"
-                
-                try:
-                    await send_sms(sender_phone, thank_you_message)
-                    
-                    # Save thank you message
-                    Message.create({
-                        "threadId": thread["_id"],
-                        "from": MTA_PHONE_NUMBER,
-                        "to": sender_phone,
-                        "body": thank_you_message,
-                        "direction": "outbound",
-                        "timestamp": datetime.now()
-                    })
-                    
-                    # Mark thread as waiting
-                    Thread.update_one(
-                        {"_id": thread["_id"]},
-                        {
-                            "waitingForDealerResponse": True,
-                            "lastMessage": thank_you_message,
-                            "lastMessageTime": datetime.now()
-                        }
-                    )
-                    print("✅ Thank you message sent, now waiting for dealer response")
-                except Exception as send_error:
-                    print(f"Error sending thank you message: {send_error}")
-                
-                return {"success": True, "message": "Entered waiting state, no further responses until dealer provides new info"}
+            state, reply, car_listing = await _decide_reply(thread, transcript, sender_phone, message_body)
             
-            # Check if agent is ready to schedule
-            # The AI may return just "#SCHEDULE#" or a message with "#SCHEDULE#" appended
-            if "#SCHEDULE#" in ai_response:
-                print("📅 Agent has all information, calling scheduling agent...")
-                print(f"   AI response contained #SCHEDULE#: {ai_response}")
-                
-                # Strip #SCHEDULE# from the response if it's there (we'll use scheduling agent's response instead)
-                ai_response = ai_response.replace("#SCHEDULE#", "").strip()
-                
-                # Call scheduling agent with the latest message
-                scheduling_result = await process_visit_scheduling(transcript, thread_id_string, sender_phone, message_body)
-                
-                if scheduling_result and isinstance(scheduling_result, dict):
-                    scheduling_message = scheduling_result.get("message", "")
-                    visit_scheduled = scheduling_result.get("visit_scheduled", False)
-                    
-                    if visit_scheduled:
-                        print(f"✅ Visit scheduled! Scheduling agent response: {scheduling_message}")
-                        ai_response = scheduling_message
-                        
-                        # Send the scheduling confirmation message
-                        try:
-                            await send_sms(sender_phone, ai_response)
-                            
-                            Message.create({
-                                "threadId": thread["_id"],
-                                "from": MTA_PHONE_NUMBER,
-                                "to": sender_phone,
-                                "body": ai_response,
-                                "direction": "outbound",
-                                "timestamp": datetime.now()
-                            })
-                            print("✅ Scheduling confirmation sent to dealer")
-                        except Exception as send_error:
-                            print(f"Error sending scheduling message: {send_error}")
-                        
-                        # Mark thread as complete
-                        Thread.update_one(
-                            {"_id": thread["_id"]},
-                            {
-                                "conversationComplete": True,
-                                "lastMessage": ai_response,
-                                "lastMessageTime": datetime.now()
-                            }
-                        )
-                        
-                        # Extract and save car listing data
-                        try:
-                            extracted_data = await extract_car_listing_data(transcript)
-                            print(f"Extracted car listing data: {extracted_data}")
-                            
-                            car_listing = CarListing.find_one({"threadId": thread["_id"]})
-                            if car_listing:
-                                CarListing.update_one(
-                                    {"threadId": thread["_id"]},
-                                    {**extracted_data, "conversationComplete": True}
-                                )
-                                print("✅ Updated existing car listing")
-                            else:
-                                CarListing.create({
-                                    "threadId": thread["_id"],
-                                    "phoneNumber": sender_phone,
-                                    **extracted_data,
-                                    "conversationComplete": True,
-                                    "extractedAt": datetime.now()
-                                })
-                                print("✅ Saved car listing data to MongoDB")
-                        except Exception as extract_error:
-                            print(f"Error extracting/saving car listing data: {extract_error}")
-                        
-                        return {"success": True, "message": "Visit scheduled, conversation complete"}
-                    else:
-                        # Scheduling agent returned a message but visit not scheduled yet
-                        print(f"📅 Scheduling agent response (visit not yet scheduled): {scheduling_message}")
-                        ai_response = scheduling_message
-                        # Continue with normal delayed response flow below - agent will keep returning #SCHEDULE# until visit is scheduled
-                elif scheduling_result:
-                    # Scheduling agent returned a string (backward compatibility)
-                    print(f"📅 Scheduling agent response (legacy format): {scheduling_result}")
-                    ai_response = scheduling_result
-                    # Continue with normal delayed response flow below
-                else:
-                    # Scheduling agent failed
-                    print("⚠️  Scheduling agent failed")
-                    ai_response = "I'm ready to schedule a visit. What date and time works for you?"
-                    # Continue with normal delayed response flow below
-            elif check_if_message_about_visit_scheduling(message_body):
-                # Dealer is asking about scheduling, but AI didn't return #SCHEDULE#
-                # Check if we have a car listing - if so, we might have all the info and should try scheduling
-                car_listing = CarListing.find_one({"threadId": thread["_id"]})
-                
-                # If we have a car listing with key fields, try calling scheduling agent
-                if car_listing and car_listing.get('make') and car_listing.get('model') and car_listing.get('year'):
-                    print("📅 Dealer asked about scheduling - checking if we should call scheduling agent...")
-                    print(f"   Car listing exists: {car_listing.get('make')} {car_listing.get('model')} {car_listing.get('year')}")
-                    
-                    # Try calling scheduling agent
-                    scheduling_result = await process_visit_scheduling(transcript, thread_id_string, sender_phone, message_body)
-                    
-                    if scheduling_result and isinstance(scheduling_result, dict):
-                        scheduling_message = scheduling_result.get("message", "")
-                        visit_scheduled = scheduling_result.get("visit_scheduled", False)
-                        
-                        if visit_scheduled:
-                            print(f"✅ Visit scheduled via fallback! Scheduling agent response: {scheduling_message}")
-                            ai_response = scheduling_message
-                            
-                            # Send the scheduling confirmation message
-                            try:
-                                await send_sms(sender_phone, ai_response)
-                                
-                                Message.create({
-                                    "threadId": thread["_id"],
-                                    "from": MTA_PHONE_NUMBER,
-                                    "to": sender_phone,
-                                    "body": ai_response,
-                                    "direction": "outbound",
-                                    "timestamp": datetime.now()
-                                })
-                                print("✅ Scheduling confirmation sent to dealer")
-                            except Exception as send_error:
-                                print(f"Error sending scheduling message: {send_error}")
-                            
-                            # Mark thread as complete
-                            Thread.update_one(
-                                {"_id": thread["_id"]},
-                                {
-                                    "conversationComplete": True,
-                                    "lastMessage": ai_response,
-                                    "lastMessageTime": datetime.now()
-                                }
-                            )
-                            
-                            # Extract and save car listing data if not already complete
-                            try:
-                                if not car_listing.get("conversationComplete"):
-                                    extracted_data = await extract_car_listing_data(transcript)
-                                    print(f"Extracted car listing data: {extracted_data}")
-                                    
-                                    CarListing.update_one(
-                                        {"threadId": thread["_id"]},
-                                        {**extracted_data, "conversationComplete": True}
-                                    )
-                                    print("✅ Updated car listing data")
-                            except Exception as extract_error:
-                                print(f"Error extracting/saving car listing data: {extract_error}")
-                            
-                            return {"success": True, "message": "Visit scheduled, conversation complete"}
-                        else:
-                            # Scheduling agent returned a message but visit not scheduled yet
-                            print(f"📅 Scheduling agent response (visit not yet scheduled): {scheduling_message}")
-                            ai_response = scheduling_message
-                            # Continue with normal delayed response flow below
-                    elif scheduling_result:
-                        # Scheduling agent returned a string (backward compatibility)
-                        print(f"📅 Scheduling agent response (legacy format): {scheduling_result}")
-                        ai_response = scheduling_result
-                        # Continue with normal delayed response flow below
-                    else:
-                        # Scheduling agent failed, use AI's original response
-                        print("⚠️  Scheduling agent failed in fallback, using AI response")
-                        # Continue with AI's original response
-                else:
-                    # No car listing or missing key fields, use AI's response
-                    print("ℹ️  Dealer asked about scheduling but no complete car listing found, using AI response")
-                    # Continue with AI's original response
+            if state is ReplyState.REPLY:
+                if reply:
+                    await _schedule_delayed_response(thread, sender_phone, reply)
             else:
-                # Schedule delayed response
-                delay_ms = 3000 # random.randint(30000, 60000)  
-                print(f"⏱️  Scheduling response to be sent in {delay_ms // 1000} seconds")
-                
-                async def send_delayed_response():
-                    try:
-                        await asyncio.sleep(delay_ms / 1000)
-                        
-                        # Check if this response was cancelled
-                        if thread_id_string not in pending_responses:
-                            print("⚠️  Response cancelled, not sending")
-                            return
-                        
-                        # Send AI-generated response
-                        await send_sms(sender_phone, ai_response)
-                        
-                        # Save outbound message
-                        Message.create({
-                            "threadId": thread["_id"],
-                            "from": MTA_PHONE_NUMBER,
-                            "to": sender_phone,
-                            "body": ai_response,
-                            "direction": "outbound",
-                            "timestamp": datetime.now()
-                        })
-                        
-                        # Update thread
-                        Thread.update_one(
-                            {"_id": thread["_id"]},
-                            {
-                                "lastMessage": ai_response,
-                                "lastMessageTime": datetime.now()
-                            }
-                        )
-                        
-                        # Remove from pending responses
-                        if thread_id_string in pending_responses:
-                            del pending_responses[thread_id_string]
-                        
-                        print("✅ AI agent response sent successfully")
-                    except Exception as send_error:
-                        if thread_id_string in pending_responses:
-                            del pending_responses[thread_id_string]
-                        print(f"Error sending AI agent response: {send_error}")
-                
-                task = asyncio.create_task(send_delayed_response())
-                pending_responses[thread_id_string] = {"task": task, "aiResponse": ai_response}
+                emit_flags, saves_car_listing, result_message = _REPLY_ACTIONS[state]
+                await _emit(thread, sender_phone, reply, **emit_flags)
+                if saves_car_listing:
+                    await _save_car_listing(thread, sender_phone, transcript, car_listing)
+                return {"success": True, "message": result_message}
         except Exception as reply_error:
-            print(f"Error generating AI agent response: {reply_error}")
+            log(f"Error generating AI agent response: {reply_error}")
         
         return {"success": True, "message": "Message processed"}
     except Exception as error:
         import traceback
-        print(f"\n❌ ERROR processing incoming SMS:")
-        print(f"   Error: {error}")
-        print(f"   Type: {type(error).__name__}")
-        print(f"   Traceback:")
-        traceback.print_exc()
+        log(f"\n❌ ERROR processing incoming SMS:")
+        log(f"   Error: {error}")
+        log(f"   Type: {type(error).__name__}")
+        log(f"   Traceback:\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail="Error processing message")
 
 
+def _serialize_value(value):
+    value_type = type(value)
+    if value_type is ObjectId:
+        return str(value)
+    if value_type is dict:
+        return serialize_document(value)
+    if value_type is list:
+        return [_serialize_value(item) for item in value]
+    return value
+
+
 def serialize_document(doc):
-    """Convert MongoDB document to JSON-serializable format"""
-    if doc is None:
-        return None
+    """Copy a MongoDB document with its ObjectIds as strings (orjson encodes datetimes itself)"""
+    # Never rewrite doc itself: cached lookups like Thread.find_by_id share one dict across callers
     if isinstance(doc, dict):
-        result = {}
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                result[key] = str(value)
-            elif isinstance(value, datetime):
-                result[key] = value.isoformat()
-            elif isinstance(value, dict):
-                result[key] = serialize_document(value)
-            elif isinstance(value, list):
-                result[key] = [serialize_document(item) for item in value]
-            else:
-                result[key] = value
-        return result
+        return {key: _serialize_value(value) for key, value in doc.items()}
     return doc
 
 
+# List endpoints stream the cursor a batch at a time instead of buffering every document
+_STREAM_BATCH_SIZE = 200
+
+
+def _next_batch(cursor) -> List[Dict[str, Any]]:
+    return list(itertools.islice(cursor, _STREAM_BATCH_SIZE))
+
+
+async def _json_array_chunks(cursor, batch: List[Dict[str, Any]]):
+    """Yield a JSON array of serialized documents, pulling each further batch in a worker thread"""
+    try:
+        prefix = b"["
+        while batch:
+            yield prefix + b",".join(orjson.dumps(serialize_document(doc)) for doc in batch)
+            prefix = b","
+            batch = await _db(_next_batch, cursor)
+        yield b"]" if prefix == b"," else b"[]"
+    finally:
+        cursor.close()
+
+
+async def _stream_cursor(cursor) -> StreamingResponse:
+    """Fetch the first batch up front so query errors still surface as a 500 before streaming starts"""
+    batch = await _db(_next_batch, cursor)
+    return StreamingResponse(_json_array_chunks(cursor, batch), media_type="application/json")
+
+
 @app.get("/api/threads")
 async def get_threads():
     try:
-        threads = Thread.find(sort=[("lastMessageTime", -1)])
-        # Convert ObjectId to string for JSON serialization
-        return [serialize_document(thread) for thread in threads]
+        # Convert ObjectId to string for JSON serialization as the cursor is streamed
+        return await _stream_cursor(Thread.find(sort=[("lastMessageTime", -1)]))
     except Exception as error:
-        print(f"Error fetching threads: {error}")
+        log(f"Error fetching threads: {error}")
         raise HTTPException(status_code=500, detail="Failed to fetch threads")
 
 
@@ -582,25 +732,25 @@ async def get_threads():
 async def get_messages(thread_id: str):
     try:
         # Verify thread exists
-        thread = Thread.find_by_id(thread_id)
+        thread = await _db(Thread.find_by_id, thread_id)
         if not thread:
             raise HTTPException(status_code=404, detail="Thread not found")
         
         # Get all messages for this thread
-        messages = Message.find({"threadId": ObjectId(thread_id)}, sort=[("timestamp", 1)])
+        response = await _stream_cursor(Message.find({"threadId": ObjectId(thread_id)}, sort=[("timestamp", 1)]))
         
         # Mark thread as read
-        Thread.update_one(
+        await _db(Thread.update_one,
             {"_id": ObjectId(thread_id)},
             {"unreadCount": 0}
         )
         
-        # Convert ObjectId to string and serialize
-        return [serialize_document(message) for message in messages]
+        # Messages are serialized as the cursor is streamed
+        return response
     except HTTPException:
         raise
     except Exception as error:
-        print(f"Error fetching messages: {error}")
+        log(f"Error fetching messages: {error}")
         raise HTTPException(status_code=500, detail="Failed to fetch messages")
 
 
@@ -610,80 +760,72 @@ async def get_car_listings():
         from models import client
         # Check if MongoDB is connected
         try:
-            client.admin.command('ping')
+            await _db(client.admin.command, 'ping')
         except:
             raise HTTPException(
                 status_code=503,
                 detail="Database unavailable - MongoDB connection is not active. Please check your connection string and network connectivity."
             )
         
-        listings = CarListing.find(sort=[("extractedAt", -1)])
-        
-        # Convert ObjectId to string and populate thread info
-        result = []
-        for listing in listings:
-            listing_serialized = serialize_document(listing)
-            thread_id = listing.get("threadId")
-            if thread_id:
-                thread = Thread.find_by_id(str(thread_id))
-                if thread:
-                    listing_serialized["thread"] = serialize_document(thread)
-            result.append(listing_serialized)
+        listings = await _db(CarListing.find_with_thread, sort=[("extractedAt", -1)])
         
-        return result
+        # Convert ObjectId to string as the cursor is streamed (thread info is already populated)
+        return await _stream_cursor(listings)
     except HTTPException:
         raise
     except Exception as error:
-        print(f"Error fetching car listings: {error}")
+        log(f"Error fetching car listings: {error}")
         raise HTTPException(status_code=500, detail="Failed to fetch car listings")
 
 
 @app.get("/api/threads/{thread_id}/car-listing")
 async def get_thread_car_listing(thread_id: str):
     try:
-        car_listing = CarListing.find_one({"threadId": ObjectId(thread_id)})
+        car_listing = await _db(lambda: next(CarListing.find_with_thread({"threadId": ObjectId(thread_id)}, limit=1), None))
         
         if not car_listing:
             raise HTTPException(status_code=404, detail="Car listing not found for this thread")
         
-        # Serialize car listing
-        car_listing_serialized = serialize_document(car_listing)
-        
-        # Populate thread info
-        thread = Thread.find_by_id(thread_id)
-        if thread:
-            car_listing_serialized["thread"] = serialize_document(thread)
-        
-        return car_listing_serialized
+        # Serialize car listing (thread info is already populated)
+        return serialize_document(car_listing)
     except HTTPException:
         raise
     except Exception as error:
-        print(f"Error fetching car listing: {error}")
+        log(f"Error fetching car listing: {error}")
         raise HTTPException(status_code=500, detail="Failed to fetch car listing")
 
 
+# Encoded /api/visits responses keyed by (start_date, end_date, Visit.generation());
+# the TTL covers visits and joined listings/threads written by other processes
+_VISITS_CACHE_TTL_SECONDS = 10
+_VISITS_CACHE_MAX_ENTRIES = 256
+_visits_cache: Dict[tuple, tuple] = {}
+
+
+def _visits_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
 @app.get("/api/visits")
-async def get_visits(start_date: Optional[str] = None, end_date: Optional[str] = None):
+async def get_visits(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None):
     """Get visits, optionally filtered by date range"""
     try:
+        if_none_match = request.headers.get("if-none-match")
+        cache_key = (start_date, end_date, Visit.generation())
+        cached = _visits_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            return _visits_response(cached[2], cached[1], if_none_match)
+        
         query = {}
         
         if start_date or end_date:
-            from dateutil import parser as date_parser
-            from dateutil.tz import gettz
-            ct_tz = gettz('America/Chicago')
-            
             date_range = {}
             if start_date:
-                start = date_parser.parse(start_date)
-                if start.tzinfo is None:
-                    start = start.replace(tzinfo=ct_tz)
-                date_range["$gte"] = start
+                date_range["$gte"] = _ensure_tz(_parse_date_param(start_date))
             if end_date:
-                end = date_parser.parse(end_date)
-                if end.tzinfo is None:
-                    end = end.replace(tzinfo=ct_tz)
-                date_range["$lte"] = end
+                date_range["$lte"] = _ensure_tz(_parse_date_param(end_date))
             
             if date_range:
                 query["scheduledTime"] = date_range
@@ -691,30 +833,17 @@ async def get_visits(start_date: Optional[str] = None, end_date: Optional[str] =
         # Exclude cancelled visits by default
         query["status"] = {"$ne": "cancelled"}
         
-        visits = Visit.find(query, sort=[("scheduledTime", 1)])
+        # Car listing and thread are populated by the aggregation
+        visits = await _db(lambda: list(Visit.find_with_details(query, sort=[("scheduledTime", 1)])))
         
-        # Serialize and populate related data
-        result = []
-        for visit in visits:
-            visit_serialized = serialize_document(visit)
-            
-            # Populate car listing if available
-            if visit.get("carListingId"):
-                car_listing = CarListing.find_by_id(str(visit["carListingId"]))
-                if car_listing:
-                    visit_serialized["carListing"] = serialize_document(car_listing)
-            
-            # Populate thread if available
-            if visit.get("threadId"):
-                thread = Thread.find_by_id(str(visit["threadId"]))
-                if thread:
-                    visit_serialized["thread"] = serialize_document(thread)
-            
-            result.append(visit_serialized)
-        
-        return result
+        body = orjson.dumps([serialize_document(visit) for visit in visits])
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        if len(_visits_cache) >= _VISITS_CACHE_MAX_ENTRIES:
+            _visits_cache.clear()
+        _visits_cache[cache_key] = (time.monotonic() + _VISITS_CACHE_TTL_SECONDS, etag, body)
+        return _visits_response(body, etag, if_none_match)
     except Exception as error:
-        print(f"Error fetching visits: {error}")
+        log(f"Error fetching visits: {error}")
         raise HTTPException(status_code=500, detail="Failed to fetch visits")
 
 
@@ -722,30 +851,20 @@ async def get_visits(start_date: Optional[str] = None, end_date: Optional[str] =
 async def get_visit(visit_id: str):
     """Get a specific visit by ID"""
     try:
-        visit = Visit.find_by_id(visit_id)
-        
-        if not visit:
+        if not ObjectId.is_valid(visit_id):
             raise HTTPException(status_code=404, detail="Visit not found")
         
-        visit_serialized = serialize_document(visit)
-        
-        # Populate car listing if available
-        if visit.get("carListingId"):
-            car_listing = CarListing.find_by_id(str(visit["carListingId"]))
-            if car_listing:
-                visit_serialized["carListing"] = serialize_document(car_listing)
+        # Car listing and thread are populated by the aggregation
+        visit = await _db(lambda: next(Visit.find_with_details({"_id": ObjectId(visit_id)}, limit=1), None))
         
-        # Populate thread if available
-        if visit.get("threadId"):
-            thread = Thread.find_by_id(str(visit["threadId"]))
-            if thread:
-                visit_serialized["thread"] = serialize_document(thread)
+        if not visit:
+            raise HTTPException(status_code=404, detail="Visit not found")
         
-        return visit_serialized
+        return serialize_document(visit)
     except HTTPException:
         raise
     except Exception as error:
-        print(f"Error fetching visit: {error}")
+        log(f"Error fetching visit: {error}")
         raise HTTPException(status_code=500, detail="Failed to fetch visit")
 
 
@@ -757,6 +876,9 @@ if __name__ == "__main__":
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     
     port = int(os.getenv("PORT", 5001))
+    # uvicorn[standard] already picks uvloop and httptools when available (loop/http "auto").
+    # Keep a single worker: per-phone webhook locks and pending delayed replies live in
+    # this process, so spreading one dealer's messages across workers would break them.
     uvicorn.run(
         app, 
         host="0.0.0.0", 
@@ -122,6 +122,13 @@ cleanup() {
 # Trap Ctrl+C
 trap cleanup SIGINT SIGTERM
 
+# Create MongoDB indexes (idempotent; the server no longer does this on import)
+echo ""
+echo -e "${GREEN}🗂️  Ensuring MongoDB indexes...${NC}"
+if ! $PYTHON_CMD helper_scripts/ensure_indexes.py; then
+    echo -e "${YELLOW}⚠️  Could not create indexes - run helper_scripts/ensure_indexes.py once MongoDB is reachable${NC}"
+fi
+
 # Start backend server
 echo ""
 echo -e "${GREEN}🚀 Starting backend server on port $PORT...${NC}"
@@ -1,11 +1,18 @@
 import re
 import os
 import json
+import orjson
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
-from openai import OpenAI
-import requests
+import bisect
+import hashlib
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone, time as dt_time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from typing import List, Optional, Dict, Any, Tuple
+from openai import AsyncOpenAI
+import httpx
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from dateutil import parser as date_parser
@@ -19,10 +26,37 @@ except ImportError:
     PLAYWRIGHT_AVAILABLE = False
     print("⚠️  Playwright not installed. JavaScript-rendered content may not be captured. Install with: pip install playwright && playwright install chromium")
 
+# lxml's C parser is much faster than the pure-Python html.parser on large listing pages
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 load_dotenv()
 
 # OpenAI configuration
-openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY')) if os.getenv('OPENAI_API_KEY') else None
+# Async clients so model calls don't block the event loop while waiting on the API.
+# OPENAI_API_KEYS (comma-separated) spreads calls round-robin across keys to share rate limits;
+# the SDK retries 429/5xx/timeouts itself with exponential backoff (honouring Retry-After)
+OPENAI_API_KEYS = [key.strip() for key in (os.getenv('OPENAI_API_KEYS') or os.getenv('OPENAI_API_KEY') or '').split(',') if key.strip()]
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '5'))
+_openai_clients = [AsyncOpenAI(api_key=key, max_retries=OPENAI_MAX_RETRIES) for key in OPENAI_API_KEYS]
+_openai_rotation = itertools.cycle(_openai_clients)
+openai_client = _openai_clients[0] if _openai_clients else None
+
+
+def _openai() -> AsyncOpenAI:
+    """Next client in the key rotation (only call when openai_client is set)"""
+    return next(_openai_rotation)
+
+
+async def close_openai_clients():
+    for client in _openai_clients:
+        await client.close()
+
+# Cheaper model for the yes/no classification calls; extraction and the agents stay on gpt-4o
+CLASSIFIER_MODEL = os.getenv('CLASSIFIER_MODEL', 'gpt-4o-mini')
 
 # Mobile Text Alerts configuration
 MTA_API_BASE_URL = 'https://api.mobile-text-alerts.com/v3'
@@ -36,17 +70,31 @@ if MTA_AUTO_REPLY_TEMPLATE_ID:
     except:
         MTA_AUTO_REPLY_TEMPLATE_ID = None
 
+# Shared async HTTP client so outbound API calls reuse pooled connections without blocking the event loop
+http_client = httpx.AsyncClient(
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+)
+
+
+_URL_RE = re.compile(r'(https?://[^\s]+)')
+# Link-like text without a scheme ("autotrader.com/...", "www...") that the regex above misses
+_BARE_LINK_HINTS = ('.com', '.net', '.org', 'www.')
+
 
 async def detect_and_extract_url(message: str) -> Optional[str]:
     """
-    Step 1: Use GPT-4o to detect if there's a link in the message and extract it.
+    Step 1: Detect if there's a link in the message and extract it.
+    Uses the URL regex, and only asks GPT-4o when the message has scheme-less link-like text.
     Returns the URL if found, None otherwise.
     """
-    if not openai_client:
-        # Fallback to regex if OpenAI is not configured
-        url_regex = r'(https?://[^\s]+)'
-        urls = re.findall(url_regex, message)
-        return urls[0] if urls else None
+    match = _URL_RE.search(message)
+    if match:
+        return match.group(1)
+    
+    message_lower = message.lower()
+    if not openai_client or 'http' in message_lower or not any(hint in message_lower for hint in _BARE_LINK_HINTS):
+        return None
     
     try:
         detection_prompt = f"""Analyze this message and determine if it contains any URLs or links. 
@@ -60,8 +108,8 @@ Return ONLY a JSON object in this format:
   "url": "complete URL string or null"
 }}"""
         
-        completion = openai_client.chat.completions.create(
-            model='gpt-4o',
+        completion = await _openai().chat.completions.create(
+            model=CLASSIFIER_MODEL,
             messages=[
                 {'role': 'system', 'content': 'You are a URL detection assistant. Analyze messages and extract URLs if present. Return only valid JSON.'},
                 {'role': 'user', 'content': detection_prompt}
@@ -74,7 +122,7 @@ Return ONLY a JSON object in this format:
         if not response_text:
             return None
         
-        data = json.loads(response_text)
+        data = orjson.loads(response_text)
         
         if data.get('hasUrl') and data.get('url'):
             url = data.get('url')
@@ -84,14 +132,194 @@ Return ONLY a JSON object in this format:
         print("ℹ️  GPT-4o found no URL in message")
         return None
     except Exception as error:
-        print(f"⚠️  Error detecting URL with GPT-4o, falling back to regex: {error}")
-        # Fallback to regex
-        url_regex = r'(https?://[^\s]+)'
-        urls = re.findall(url_regex, message)
-        return urls[0] if urls else None
+        print(f"⚠️  Error detecting URL with GPT-4o: {error}")
+        return None
+
+
+# Shared headless browser, launched on first scrape instead of once per URL
+_playwright = None
+_browser = None
+_browser_lock = asyncio.Lock()
+_scrape_slots = asyncio.Semaphore(int(os.getenv('SCRAPE_CONCURRENCY', '4')))
+
+
+async def _get_browser():
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            # Launch browser with more realistic settings to avoid bot detection
+            _browser = await _playwright.chromium.launch(
+                headless=True,
+                args=[
+                    '--disable-blink-features=AutomationControlled',
+                    '--disable-dev-shm-usage',
+                    '--no-sandbox'
+                ]
+            )
+    return _browser
+
+
+async def close_browser():
+    """Close the shared scraping browser (if one was launched)"""
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is not None:
+            await _browser.close()
+            _browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
+
+
+# Scrape results keyed by canonical URL (tracking params stripped); concurrent
+# requests for the same URL wait on one in-flight scrape instead of starting their own.
+# Misses fall through to the MongoDB-backed ScrapeCache before actually scraping.
+_SCRAPE_CACHE_TTL_SECONDS = 600
+_SCRAPE_CACHE_MAX_ENTRIES = 1024
+_scrape_cache: Dict[str, tuple] = {}
+_scrapes_in_flight: Dict[str, asyncio.Task] = {}
+
+
+def _canonical_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not key.lower().startswith('utm_')])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+
+def _has_listing_data(extracted_data: Dict[str, Any]) -> bool:
+    """False for all-null results (blocked or error pages) that shouldn't be cached"""
+    return any(extracted_data.get(field) is not None for field in _JSON_LD_CORE_FIELDS)
 
 
 async def scrape_and_extract_car_data(url: str) -> Dict[str, Any]:
+    """Cached wrapper around _scrape_and_extract_car_data (see _SCRAPE_CACHE_TTL_SECONDS)"""
+    key = _canonical_url(url)
+    cached = _scrape_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        print(f'📦 Using cached scrape for URL: {url}')
+        return {**cached[1], 'url': url, 'extractedAt': datetime.now()}
+    
+    task = _scrapes_in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_scrape_with_persistent_cache(key, url))
+        _scrapes_in_flight[key] = task
+        task.add_done_callback(lambda _: _scrapes_in_flight.pop(key, None))
+    # Shielded so one caller giving up doesn't cancel the scrape for the others
+    extracted_data = await asyncio.shield(task)
+    
+    if _has_listing_data(extracted_data):
+        if len(_scrape_cache) >= _SCRAPE_CACHE_MAX_ENTRIES:
+            _scrape_cache.clear()
+        _scrape_cache[key] = (time.monotonic() + _SCRAPE_CACHE_TTL_SECONDS, extracted_data)
+    return {**extracted_data, 'url': url, 'extractedAt': datetime.now()}
+
+
+async def _scrape_with_persistent_cache(key: str, url: str) -> Dict[str, Any]:
+    from models import ScrapeCache
+    
+    cache_key = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    try:
+        stored = await asyncio.to_thread(ScrapeCache.get, cache_key)
+        if stored:
+            print(f'📦 Using stored scrape for URL: {url}')
+            return stored
+    except Exception as error:
+        print(f'⚠️  Could not read scrape cache: {error}')
+    
+    extracted_data = await _scrape_and_extract_car_data(url)
+    if not _has_listing_data(extracted_data):
+        return extracted_data
+    try:
+        stored = {field: value for field, value in extracted_data.items() if field not in ('url', 'extractedAt')}
+        await asyncio.to_thread(ScrapeCache.set, cache_key, stored)
+    except Exception as error:
+        print(f'⚠️  Could not store scrape cache: {error}')
+    return extracted_data
+
+
+_LISTING_FIELDS = (
+    'make', 'model', 'year', 'miles', 'listingPrice', 'tireLifeLeft', 'titleStatus',
+    'carfaxDamageIncidents', 'docFeeQuoted', 'docFeeNegotiable', 'docFeeAgreed', 'lowestPrice'
+)
+_JSON_LD_CORE_FIELDS = ('make', 'model', 'year', 'miles', 'listingPrice')
+_JSON_LD_LISTING_TYPES = {'Car', 'Vehicle', 'Product'}
+
+_HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'title'}
+_TEXT_TAGS = [*_HEADING_TAGS, 'meta', 'span', 'div', 'p', 'td', 'li']
+_SNIPPET_INDICATORS = ['$', 'price', 'miles', 'mileage', 'year', 'make', 'model', 'vin', 'odometer']
+_SNIPPET_INDICATOR_RE = re.compile('|'.join(re.escape(indicator) for indicator in _SNIPPET_INDICATORS), re.IGNORECASE)
+
+# Page text sent to GPT-4o is capped at the highest-signal snippets
+_PAGE_TEXT_BUDGET = 3000
+_LONG_NUMBER_RE = re.compile(r'\d{4,6}')
+
+
+def _snippet_score(text: str) -> int:
+    """Rank a page snippet by how many price, mileage and year/VIN-like numbers it mentions"""
+    return text.count('$') + text.lower().count('mile') + len(_LONG_NUMBER_RE.findall(text))
+
+
+def _iter_json_ld_nodes(data):
+    """Yield every object in a JSON-LD block, including arrays and @graph members"""
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_json_ld_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        if '@graph' in data:
+            yield from _iter_json_ld_nodes(data['@graph'])
+
+
+def _json_ld_name(value) -> Optional[str]:
+    if isinstance(value, dict):
+        value = value.get('name')
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if not value:
+        return None
+    return str(value).strip() or None
+
+
+def _json_ld_number(value) -> Optional[float]:
+    if isinstance(value, dict):
+        value = value.get('value', value.get('price'))
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.search(r'\d[\d,]*(?:\.\d+)?', value)
+        if match:
+            return float(match.group(0).replace(',', ''))
+    return None
+
+
+def _listing_from_json_ld(blocks: List[Any]) -> Dict[str, Any]:
+    """Map the first schema.org Car/Vehicle/Product node onto car listing fields (only fields found)"""
+    for node in _iter_json_ld_nodes(blocks):
+        node_types = node.get('@type')
+        node_types = set(node_types) if isinstance(node_types, list) else {node_types}
+        if not node_types & _JSON_LD_LISTING_TYPES:
+            continue
+        
+        listing = {
+            'make': _json_ld_name(node.get('brand') or node.get('manufacturer')),
+            'model': _json_ld_name(node.get('model'))
+        }
+        year = node.get('vehicleModelDate') or node.get('modelDate') or node.get('productionDate')
+        year_match = re.search(r'\b(19|20)\d{2}\b', str(year)) if year else None
+        listing['year'] = int(year_match.group(0)) if year_match else None
+        miles = _json_ld_number(node.get('mileageFromOdometer'))
+        listing['miles'] = int(miles) if miles is not None else None
+        offers = node.get('offers')
+        if isinstance(offers, list):
+            offers = offers[0] if offers else None
+        listing['listingPrice'] = _json_ld_number(offers) if offers else None
+        return {field: value for field, value in listing.items() if value is not None}
+    return {}
+
+
+async def _scrape_and_extract_car_data(url: str) -> Dict[str, Any]:
     """
     Steps 2 & 3: Fetch HTML from URL and extract car data using GPT-4o
     Step 2: Fetch and parse HTML
@@ -109,164 +337,159 @@ async def scrape_and_extract_car_data(url: str) -> Dict[str, Any]:
         if PLAYWRIGHT_AVAILABLE:
             try:
                 print("   Using Playwright to render JavaScript content...")
-                async with async_playwright() as p:
-                    # Launch browser with more realistic settings to avoid bot detection
-                    browser = await p.chromium.launch(
-                        headless=True,
-                        args=[
-                            '--disable-blink-features=AutomationControlled',
-                            '--disable-dev-shm-usage',
-                            '--no-sandbox'
-                        ]
-                    )
+                # Bounded so a burst of scrapes queues instead of opening unlimited pages
+                async with _scrape_slots:
+                    browser = await _get_browser()
                     
-                    # Create a new context with realistic viewport and user agent
+                    # Fresh context per scrape (cheap compared to a browser launch) with realistic viewport and user agent
                     context = await browser.new_context(
                         viewport={'width': 1920, 'height': 1080},
                         user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
                         locale='en-US',
                         timezone_id='America/New_York'
                     )
-                    
-                    page = await context.new_page()
-                    
-                    # Add extra headers to look more like a real browser
-                    await page.set_extra_http_headers({
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                        'Accept-Language': 'en-US,en;q=0.9',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'Connection': 'keep-alive',
-                        'Upgrade-Insecure-Requests': '1',
-                        'Sec-Fetch-Dest': 'document',
-                        'Sec-Fetch-Mode': 'navigate',
-                        'Sec-Fetch-Site': 'none',
-                        'Cache-Control': 'max-age=0'
-                    })
-                    
-                    # Navigate to the page with multiple wait strategies
-                    print("   Navigating to page and waiting for content...")
-                    await page.goto(url, wait_until='domcontentloaded', timeout=30000)
-                    
-                    # Wait for network to be idle
-                    try:
-                        await page.wait_for_load_state('networkidle', timeout=10000)
-                    except:
-                        print("   Network didn't become idle, continuing anyway...")
-                    
-                    # Wait additional time for JavaScript to render
-                    await asyncio.sleep(3)
-                    
-                    # Try to wait for common car listing elements
                     try:
-                        # Wait for any of these common elements that indicate page loaded
-                        await page.wait_for_selector('h1, [class*="price"], [class*="Price"], [data-testid*="price"]', timeout=5000)
-                    except:
-                        print("   Couldn't find expected elements, but continuing...")
-                    
-                    # Scroll down to trigger lazy loading
-                    await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
-                    await asyncio.sleep(1)
-                    await page.evaluate('window.scrollTo(0, 0)')
-                    await asyncio.sleep(1)
-                    
-                    # Check if we got an error page
-                    page_text_preview = await page.inner_text('body')
-                    page_title = await page.title()
-                    
-                    if 'unavailable' in page_text_preview.lower() or 'error' in page_text_preview.lower() or len(page_text_preview) < 500:
-                        print(f"   ⚠️  Page may be showing an error or is blocked.")
-                        print(f"   Page title: {page_title}")
-                        print(f"   Content preview: {page_text_preview[:200]}...")
-                        print(f"   ⚠️  Autotrader may be blocking automated access. Will try to extract what we can.")
-                    
-                    # Get the fully rendered HTML (even if it's an error page, might have some data)
-                    html_content = await page.content()
-                    await browser.close()
-                    
-                    print(f"✅ Step 2 complete: Fetched {len(html_content)} characters of HTML")
+                        page = await context.new_page()
+                        
+                        # Add extra headers to look more like a real browser
+                        await page.set_extra_http_headers({
+                            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                            'Accept-Language': 'en-US,en;q=0.9',
+                            'Accept-Encoding': 'gzip, deflate, br',
+                            'Connection': 'keep-alive',
+                            'Upgrade-Insecure-Requests': '1',
+                            'Sec-Fetch-Dest': 'document',
+                            'Sec-Fetch-Mode': 'navigate',
+                            'Sec-Fetch-Site': 'none',
+                            'Cache-Control': 'max-age=0'
+                        })
+                        
+                        # Navigate to the page with multiple wait strategies
+                        print("   Navigating to page and waiting for content...")
+                        await page.goto(url, wait_until='domcontentloaded', timeout=30000)
+                        
+                        # Wait for the listing heading/price instead of fixed sleeps and scrolling
+                        try:
+                            await page.wait_for_selector('h1, [class*="price"], [class*="Price"], [data-testid*="price"]', timeout=8000)
+                        except:
+                            print("   Couldn't find expected elements, but continuing...")
+                        
+                        # Lazy-rendered prices: returns as soon as a dollar amount shows up in a price element
+                        try:
+                            await page.wait_for_function(
+                                """() => Array.from(document.querySelectorAll('[class*="price"], [class*="Price"], [data-testid*="price"]'))
+                                    .some(el => /\\$\\s*\\d/.test(el.innerText || ''))""",
+                                timeout=5000
+                            )
+                        except:
+                            print("   No rendered price found, continuing...")
+                        
+                        # Check if we got an error page
+                        page_text_preview = await page.inner_text('body')
+                        page_title = await page.title()
+                        
+                        if 'unavailable' in page_text_preview.lower() or 'error' in page_text_preview.lower() or len(page_text_preview) < 500:
+                            print(f"   ⚠️  Page may be showing an error or is blocked.")
+                            print(f"   Page title: {page_title}")
+                            print(f"   Content preview: {page_text_preview[:200]}...")
+                            print(f"   ⚠️  Autotrader may be blocking automated access. Will try to extract what we can.")
+                        
+                        # Get the fully rendered HTML (even if it's an error page, might have some data)
+                        html_content = await page.content()
+                    finally:
+                        await context.close()
+                
+                print(f"✅ Step 2 complete: Fetched {len(html_content)} characters of HTML")
             except Exception as playwright_error:
-                print(f"⚠️  Playwright failed ({playwright_error}), falling back to requests...")
+                print(f"⚠️  Playwright failed ({playwright_error}), falling back to a plain HTTP fetch...")
                 html_content = None
         
-        # Fallback to requests if Playwright not available or failed
+        # Fallback to a plain fetch on the shared client if Playwright not available or failed
         if not html_content:
-            print("   Using requests (may miss JavaScript-rendered content)...")
-            response = requests.get(
+            print("   Using plain HTTP fetch (may miss JavaScript-rendered content)...")
+            response = await http_client.get(
                 url,
                 headers={
                     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
                 },
-                timeout=10
+                follow_redirects=True
             )
             html_content = response.text
             print(f"✅ Step 2 complete: Fetched {len(html_content)} characters of HTML")
         
         # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = BeautifulSoup(html_content, HTML_PARSER)
         
-        # Try to find JSON-LD structured data first (many sites use this)
+        # Try to find JSON-LD structured data first (many sites use this); the same pass
+        # removes script and style elements so they don't leak into the extracted text
         json_ld_data = None
-        for script in soup.find_all('script', type='application/ld+json'):
-            try:
-                json_ld_data = json.loads(script.string)
-                print(f"📋 Found JSON-LD structured data")
-                break
-            except:
-                continue
-        
-        # Remove script and style elements first
-        for script in soup(["script", "style", "noscript"]):
-            script.decompose()
-        
-        # Extract text from key elements that typically contain car info
-        relevant_text_parts = []
+        json_ld_blocks = []
+        for tag in soup.find_all(['script', 'style', 'noscript']):
+            if tag.name == 'script' and tag.get('type') == 'application/ld+json':
+                try:
+                    json_ld_blocks.append(orjson.loads(tag.string))
+                except:
+                    pass
+            tag.decompose()
+        if json_ld_blocks:
+            json_ld_data = json_ld_blocks[0]
+            print(f"📋 Found JSON-LD structured data")
         
-        # Get title/heading text (important for car listings)
-        for tag in soup.find_all(['h1', 'h2', 'h3', 'h4', 'title']):
-            text = tag.get_text(strip=True)
-            if text and len(text) > 0:
-                relevant_text_parts.append(text)
+        # A schema.org Vehicle/Car/Product node with the core fields makes the GPT-4o call unnecessary
+        json_ld_listing = _listing_from_json_ld(json_ld_blocks)
+        if sum(json_ld_listing.get(field) is not None for field in _JSON_LD_CORE_FIELDS) >= 4:
+            extracted_data = {field: None for field in _LISTING_FIELDS}
+            extracted_data.update(json_ld_listing)
+            extracted_data['url'] = url
+            extracted_data['extractedAt'] = datetime.now()
+            print(f'✅ Step 3 skipped: JSON-LD provided {len(json_ld_listing)} fields, not calling GPT-4o')
+            print(f'   Extracted data: {extracted_data}')
+            return extracted_data
         
-        # Get all text that contains numbers (likely prices, miles, years)
-        # Look for patterns like $XX,XXX or XX,XXX miles
-        for tag in soup.find_all(['span', 'div', 'p', 'td', 'li']):
-            text = tag.get_text(strip=True)
-            # Include if it has price indicators, numbers, or car-related keywords
-            if any(indicator in text.lower() for indicator in ['$', 'price', 'miles', 'mileage', 'year', 'make', 'model', 'vin', 'odometer']):
-                if text and len(text) > 0 and len(text) < 200:  # Avoid huge blocks
-                    relevant_text_parts.append(text)
-        
-        # Get main content areas
-        for tag in soup.find_all(['main', 'article', 'section']):
+        # One walk over the page, bucketing each tag by name:
+        # title/heading text (important for car listings) and price/vehicle meta tags go first,
+        # short snippets with price indicators or car-related keywords (likely prices, miles, years) are ranked
+        heading_parts = []
+        snippet_parts = []
+        for tag in soup.find_all(_TEXT_TAGS):
+            if tag.name == 'meta':
+                content = tag.get('content', '')
+                property_attr = tag.get('property', '')
+                if content and ('price' in property_attr.lower() or 'vehicle' in property_attr.lower()):
+                    heading_parts.append(content)
+                continue
             text = tag.get_text(strip=True)
-            if text and len(text) > 100:  # Only substantial content
-                relevant_text_parts.append(text[:1000])  # Limit each section
-        
-        # Also extract from data attributes and meta tags
-        for meta in soup.find_all('meta'):
-            content = meta.get('content', '')
-            property_attr = meta.get('property', '')
-            if content and ('price' in property_attr.lower() or 'vehicle' in property_attr.lower()):
-                relevant_text_parts.append(content)
+            if not text:
+                continue
+            if tag.name in _HEADING_TAGS:
+                heading_parts.append(text)
+            elif len(text) < 200 and _SNIPPET_INDICATOR_RE.search(text):
+                snippet_parts.append(text)
         
-        # Get all visible text as comprehensive fallback
-        all_text = soup.get_text(separator=' ', strip=True)
+        # Dedupe, then keep the highest-signal snippets until the budget is used
+        heading_parts = list(dict.fromkeys(heading_parts))
+        seen = set(heading_parts)
+        snippet_parts = [text for text in dict.fromkeys(snippet_parts) if text not in seen]
+        snippet_parts.sort(key=_snippet_score, reverse=True)
+        relevant_text_parts = []
+        budget = _PAGE_TEXT_BUDGET
+        for text in heading_parts + snippet_parts:
+            if budget <= 0:
+                break
+            relevant_text_parts.append(text[:budget])
+            budget -= len(text) + 1
         
-        # Combine all text sources, prioritizing structured data
         if relevant_text_parts:
             page_text = ' '.join(relevant_text_parts)
-            # Add a sample of all text to catch anything we missed
-            if len(all_text) > len(page_text):
-                page_text += ' ' + all_text[:2000]
             print(f"📄 Extracted {len(page_text)} characters from relevant HTML elements")
         else:
             # Fallback to general text extraction
-            page_text = all_text
+            page_text = soup.get_text(separator=' ', strip=True)[:_PAGE_TEXT_BUDGET]
             print(f"📄 Using general text extraction: {len(page_text)} characters")
         
         # Include JSON-LD data if found
         if json_ld_data:
-            page_text = f"Structured Data: {json.dumps(json_ld_data, indent=2)}\n\nPage Content: {page_text}"
+            page_text = f"Structured Data: {orjson.dumps(json_ld_data).decode()}\n\nPage Content: {page_text}"
         
         # Limit text length to avoid token limits (keep first 12000 characters for better extraction)
         limited_text = page_text[:12000]
@@ -312,7 +535,7 @@ Return ONLY valid JSON in this exact format (no markdown, no code blocks):
   "lowestPrice": number or null
 }}"""
         
-        completion = openai_client.chat.completions.create(
+        completion = await _openai().chat.completions.create(
             model='gpt-4o',
             messages=[
                 {'role': 'system', 'content': 'You are a data extraction assistant. Extract structured car listing data from web pages and return only valid JSON.'},
@@ -328,25 +551,15 @@ Return ONLY valid JSON in this exact format (no markdown, no code blocks):
             raise ValueError('No response from OpenAI')
         
         # Parse JSON response
-        data = json.loads(response_text)
+        data = orjson.loads(response_text)
         
-        # Ensure numbers are actually numbers
-        extracted_data = {
-            'make': data.get('make') or None,
-            'model': data.get('model') or None,
-            'year': int(data['year']) if data.get('year') is not None else None,
-            'miles': int(data['miles']) if data.get('miles') is not None else None,
-            'listingPrice': float(data['listingPrice']) if data.get('listingPrice') is not None else None,
-            'tireLifeLeft': bool(data['tireLifeLeft']) if data.get('tireLifeLeft') is not None else None,
-            'titleStatus': data.get('titleStatus', '').lower() if data.get('titleStatus') and data.get('titleStatus').lower() in ['clean', 'rebuilt', 'check_carfax'] else None,
-            'carfaxDamageIncidents': _normalize_carfax_value(data.get('carfaxDamageIncidents')),
-            'docFeeQuoted': float(data['docFeeQuoted']) if data.get('docFeeQuoted') is not None else None,
-            'docFeeNegotiable': bool(data['docFeeNegotiable']) if data.get('docFeeNegotiable') is not None else None,
-            'docFeeAgreed': float(data['docFeeAgreed']) if data.get('docFeeAgreed') is not None else None,
-            'lowestPrice': float(data['lowestPrice']) if data.get('lowestPrice') is not None else None,
-            'url': url,
-            'extractedAt': datetime.now()
-        }
+        extracted_data = _coerce_listing_fields(data)
+        extracted_data['url'] = url
+        extracted_data['extractedAt'] = datetime.now()
+        # Fill anything GPT-4o missed from the structured data
+        for field, value in json_ld_listing.items():
+            if extracted_data.get(field) is None:
+                extracted_data[field] = value
         
         print(f'✅ Step 3 complete: GPT-4o extracted {len([k for k, v in extracted_data.items() if v is not None])} fields from HTML')
         print(f'   Extracted data: {extracted_data}')
@@ -369,17 +582,101 @@ def _normalize_carfax_value(value: Any) -> Optional[str]:
     return None
 
 
+def _coerce_listing_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize GPT-extracted listing fields (ensure numbers are actually numbers)"""
+    return {
+        'make': data.get('make') or None,
+        'model': data.get('model') or None,
+        'year': int(data['year']) if data.get('year') is not None else None,
+        'miles': int(data['miles']) if data.get('miles') is not None else None,
+        'listingPrice': float(data['listingPrice']) if data.get('listingPrice') is not None else None,
+        'tireLifeLeft': bool(data['tireLifeLeft']) if data.get('tireLifeLeft') is not None else None,
+        'titleStatus': data.get('titleStatus', '').lower() if data.get('titleStatus') and data.get('titleStatus').lower() in ['clean', 'rebuilt', 'check_carfax'] else None,
+        'carfaxDamageIncidents': _normalize_carfax_value(data.get('carfaxDamageIncidents')),
+        'docFeeQuoted': float(data['docFeeQuoted']) if data.get('docFeeQuoted') is not None else None,
+        'docFeeNegotiable': bool(data['docFeeNegotiable']) if data.get('docFeeNegotiable') is not None else None,
+        'docFeeAgreed': float(data['docFeeAgreed']) if data.get('docFeeAgreed') is not None else None,
+        'lowestPrice': float(data['lowestPrice']) if data.get('lowestPrice') is not None else None
+    }
+
+
+_CHECK_CARFAX_DISPLAY = 'Check Carfax (link provided)'
+_CARFAX_DISPLAY = {'yes': 'Yes', 'no': 'No', 'unsure': 'Unsure', 'check_carfax': _CHECK_CARFAX_DISPLAY}
+
+
+def _yes_no(value) -> str:
+    return 'Yes' if value else 'No'
+
+
+def _dollars(value) -> str:
+    return f"${value:,}"
+
+
+# (field, prompt label, formatter) in the order the buyer agent asks for them
+_KNOWN_FIELD_LABELS = (
+    ('make', 'Car make', str),
+    ('model', 'Car model', str),
+    ('year', 'Car year', str),
+    ('miles', 'Number of miles', lambda v: f"{v:,}"),
+    ('listingPrice', 'Listing price', _dollars),
+    ('tireLifeLeft', 'Tires have life left', _yes_no),
+    ('titleStatus', 'Title status', lambda v: _CHECK_CARFAX_DISPLAY if v == 'check_carfax' else v),
+    ('carfaxDamageIncidents', 'Carfax damage incidents', lambda v: _CARFAX_DISPLAY.get(v, 'Unknown')),
+    ('docFeeQuoted', 'Doc fee quoted', _dollars),
+    ('docFeeNegotiable', 'Doc fee negotiable', _yes_no),
+    ('docFeeAgreed', 'Doc fee agreed', _dollars),
+    ('lowestPrice', 'Lowest price', _dollars),
+)
+
+
+def _format_known_fields(known_data: Optional[Dict[str, Any]]) -> List[str]:
+    """Prompt lines ("- Car make: ...") for the listing fields already known"""
+    if not known_data:
+        return []
+    return [
+        f"- {label}: {fmt(known_data[field])}"
+        for field, label, fmt in _KNOWN_FIELD_LABELS
+        if known_data.get(field) not in (None, '')
+    ]
+
+
 async def build_conversation_transcript(thread_id: str, Message) -> str:
     """Build conversation transcript from messages"""
     from bson import ObjectId
-    messages = Message.find({'threadId': ObjectId(thread_id)}, sort=[('timestamp', 1)])
     
-    transcript_lines = []
-    for msg in messages:
-        sender = 'Dealer' if msg['direction'] == 'inbound' else 'You'
-        transcript_lines.append(f"{sender}: {msg['body']}")
+    def build():
+        # Only the two fields the transcript uses come over the wire
+        messages = Message.find(
+            {'threadId': ObjectId(thread_id)},
+            sort=[('timestamp', 1)],
+            projection={'direction': 1, 'body': 1, '_id': 0}
+        )
+        return '\n'.join(
+            f"{'Dealer' if msg['direction'] == 'inbound' else 'You'}: {msg['body']}"
+            for msg in messages
+        )
     
-    return '\n'.join(transcript_lines)
+    # Cursor iteration blocks, so run it in a worker thread
+    return await asyncio.to_thread(build)
+
+
+# Turn boundaries in a transcript from build_conversation_transcript (bodies may contain newlines)
+_TURN_BOUNDARY_RE = re.compile(r'\n(?=(?:Dealer|You): )')
+# The buyer agent only has the transcript to know what's been asked, so its window is a
+# guard for runaway threads, well above a normal 15-20 turn conversation
+_AGENT_TRANSCRIPT_MAX_TURNS = 40
+# The visit extractor only needs the latest proposal and its immediate context
+_EXTRACTOR_TRANSCRIPT_MAX_TURNS = 6
+
+
+def _windowed_transcript(transcript: str, max_turns: int) -> str:
+    """Keep only the last max_turns turns of a transcript"""
+    if not transcript:
+        return transcript
+    turns = _TURN_BOUNDARY_RE.split(transcript)
+    if len(turns) <= max_turns:
+        return transcript
+    return '\n'.join(turns[-max_turns:])
 
 
 async def extract_car_listing_data(conversation_transcript: str) -> Dict[str, Any]:
@@ -423,7 +720,7 @@ Return ONLY valid JSON in this exact format (no markdown, no code blocks):
 }}"""
     
     try:
-        completion = openai_client.chat.completions.create(
+        completion = await _openai().chat.completions.create(
             model='gpt-4o',
             messages=[
                 {'role': 'system', 'content': 'You are a data extraction assistant. Extract structured data from conversations and return only valid JSON.'},
@@ -438,51 +735,59 @@ Return ONLY valid JSON in this exact format (no markdown, no code blocks):
         if not response_text:
             raise ValueError('No response from OpenAI')
         
-        data = json.loads(response_text)
+        data = orjson.loads(response_text)
         
-        # Ensure numbers are actually numbers
-        extracted_data = {
-            'make': data.get('make') or None,
-            'model': data.get('model') or None,
-            'year': int(data['year']) if data.get('year') is not None else None,
-            'miles': int(data['miles']) if data.get('miles') is not None else None,
-            'listingPrice': float(data['listingPrice']) if data.get('listingPrice') is not None else None,
-            'tireLifeLeft': bool(data['tireLifeLeft']) if data.get('tireLifeLeft') is not None else None,
-            'titleStatus': data.get('titleStatus', '').lower() if data.get('titleStatus') and data.get('titleStatus').lower() in ['clean', 'rebuilt', 'check_carfax'] else None,
-            'carfaxDamageIncidents': _normalize_carfax_value(data.get('carfaxDamageIncidents')),
-            'docFeeQuoted': float(data['docFeeQuoted']) if data.get('docFeeQuoted') is not None else None,
-            'docFeeNegotiable': bool(data['docFeeNegotiable']) if data.get('docFeeNegotiable') is not None else None,
-            'docFeeAgreed': float(data['docFeeAgreed']) if data.get('docFeeAgreed') is not None else None,
-            'lowestPrice': float(data['lowestPrice']) if data.get('lowestPrice') is not None else None
-        }
-        
-        return extracted_data
+        return _coerce_listing_fields(data)
     except Exception as error:
         print(f'Error extracting car listing data: {error}')
         raise
 
 
+# Phrases meaning the dealer will follow up later
+_GET_BACK_PATTERNS = [
+    r'will get back',
+    r'get back to you',
+    r'will update you',
+    r'update you as soon',
+    r'will reach out',
+    r'reach out as soon',
+    r'will be in touch',
+    r'be in touch as soon',
+    r'working to get',
+    r'gathering.*information',
+    r'collecting.*information',
+    r'looking into',
+    r'will provide',
+    r'provide.*as soon'
+]
+
+# Acknowledgment phrases: the get-back phrases plus polite filler
+_ACKNOWLEDGMENT_PATTERNS = _GET_BACK_PATTERNS + [
+    r'sounds good',
+    r'thank you for your patience',
+    r'thank you for checking in',
+    r'still working',
+    r'still gathering',
+    r'still collecting'
+]
+
+
+def _compile_any(patterns: List[str]) -> re.Pattern:
+    """Fuse patterns into one case-insensitive alternation so a message is scanned once"""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+
+_GET_BACK_RE = _compile_any(_GET_BACK_PATTERNS)
+_ACKNOWLEDGMENT_RE = _compile_any(_ACKNOWLEDGMENT_PATTERNS)
+
+_HAS_DIGIT_RE = re.compile(r'\d')
+# A dollar sign or a 4+ digit number (year, price, miles) is always new info
+_HAS_MONEY_OR_NUMBER_RE = re.compile(r'\$|\b\d{4,}\b')
+
+
 def dealer_says_will_get_back(message: str) -> bool:
     """Detect if dealer says they'll get back to the agent"""
-    patterns = [
-        r'will get back',
-        r'get back to you',
-        r'will update you',
-        r'update you as soon',
-        r'will reach out',
-        r'reach out as soon',
-        r'will be in touch',
-        r'be in touch as soon',
-        r'working to get',
-        r'gathering.*information',
-        r'collecting.*information',
-        r'looking into',
-        r'will provide',
-        r'provide.*as soon'
-    ]
-    
-    message_lower = message.lower()
-    return any(re.search(pattern, message_lower) for pattern in patterns)
+    return _GET_BACK_RE.search(message) is not None
 
 
 async def message_contains_new_information(message: str, known_data: Optional[Dict[str, Any]] = None) -> bool:
@@ -492,78 +797,24 @@ async def message_contains_new_information(message: str, known_data: Optional[Di
         return True
     
     # Check for common acknowledgment phrases
-    acknowledgment_patterns = [
-        r'sounds good',
-        r'will get back',
-        r'get back to you',
-        r'will update you',
-        r'update you as soon',
-        r'will reach out',
-        r'reach out as soon',
-        r'will be in touch',
-        r'be in touch as soon',
-        r'working to get',
-        r'gathering.*information',
-        r'collecting.*information',
-        r'looking into',
-        r'will provide',
-        r'provide.*as soon',
-        r'thank you for your patience',
-        r'thank you for checking in',
-        r'still working',
-        r'still gathering',
-        r'still collecting'
-    ]
-    
-    message_lower = message.lower()
     is_just_acknowledgment = (
-        any(re.search(pattern, message_lower) for pattern in acknowledgment_patterns) and
-        not re.search(r'\d+', message) and  # No numbers
+        _ACKNOWLEDGMENT_RE.search(message) is not None and
+        not _HAS_DIGIT_RE.search(message) and  # No numbers
         '$' not in message  # No dollar signs
     )
     
     if is_just_acknowledgment:
         return False
     
+    if _HAS_MONEY_OR_NUMBER_RE.search(message):
+        return True
+    
     # Use GPT to check if message contains new information
     try:
         known_info_section = ''
-        if known_data:
-            known_fields = []
-            if known_data.get('make'):
-                known_fields.append(f"- Car make: {known_data['make']}")
-            if known_data.get('model'):
-                known_fields.append(f"- Car model: {known_data['model']}")
-            if known_data.get('year'):
-                known_fields.append(f"- Car year: {known_data['year']}")
-            if known_data.get('miles') is not None:
-                known_fields.append(f"- Number of miles: {known_data['miles']:,}")
-            if known_data.get('listingPrice') is not None:
-                known_fields.append(f"- Listing price: ${known_data['listingPrice']:,}")
-            if known_data.get('tireLifeLeft') is not None:
-                known_fields.append(f"- Tires have life left: {'Yes' if known_data['tireLifeLeft'] else 'No'}")
-            if known_data.get('titleStatus'):
-                title_display = 'Check Carfax (link provided)' if known_data['titleStatus'] == 'check_carfax' else known_data['titleStatus']
-                known_fields.append(f"- Title status: {title_display}")
-            if known_data.get('carfaxDamageIncidents') is not None:
-                carfax_display = {
-                    'yes': 'Yes',
-                    'no': 'No',
-                    'unsure': 'Unsure',
-                    'check_carfax': 'Check Carfax (link provided)'
-                }.get(known_data['carfaxDamageIncidents'], 'Unknown')
-                known_fields.append(f"- Carfax damage incidents: {carfax_display}")
-            if known_data.get('docFeeQuoted') is not None:
-                known_fields.append(f"- Doc fee quoted: ${known_data['docFeeQuoted']:,}")
-            if known_data.get('docFeeNegotiable') is not None:
-                known_fields.append(f"- Doc fee negotiable: {'Yes' if known_data['docFeeNegotiable'] else 'No'}")
-            if known_data.get('docFeeAgreed') is not None:
-                known_fields.append(f"- Doc fee agreed: ${known_data['docFeeAgreed']:,}")
-            if known_data.get('lowestPrice') is not None:
-                known_fields.append(f"- Lowest price: ${known_data['lowestPrice']:,}")
-            
-            if known_fields:
-                known_info_section = f"\n\nKnown information:\n" + '\n'.join(known_fields)
+        known_fields = _format_known_fields(known_data)
+        if known_fields:
+            known_info_section = f"\n\nKnown information:\n" + '\n'.join(known_fields)
         
         prompt = f"""Does this dealer message contain NEW information about the car (make, model, year, miles, price, tire condition, title status, carfax, doc fee, etc.) that is not already known?{known_info_section}
 
@@ -571,8 +822,8 @@ Dealer message: "{message}"
 
 Respond with ONLY "YES" if the message contains new information (like specific numbers, prices, details about the car, etc.), or "NO" if it's just an acknowledgment, confirmation, or promise to get back later."""
         
-        completion = openai_client.chat.completions.create(
-            model='gpt-4o',
+        completion = await _openai().chat.completions.create(
+            model=CLASSIFIER_MODEL,
             messages=[
                 {'role': 'system', 'content': 'You are a helpful assistant that determines if a message contains new information.'},
                 {'role': 'user', 'content': prompt}
@@ -589,6 +840,47 @@ Respond with ONLY "YES" if the message contains new information (like specific n
         return True
 
 
+# System prompts are kept free of per-request values so every call shares the same
+# prefix and OpenAI's automatic prompt caching can reuse it; dynamic context goes
+# in the user message instead
+_BUYER_SYSTEM_PROMPT = """<role>
+You are a savvy used car buyer texting a dealer about a car you showed interest in online.
+</role>
+
+<fields>
+Get these from the dealer, in order:
+1. make 2. model 3. year 4. miles 5. listing price 6. tires have life left (yes/no) 7. title (clean/rebuilt) 8. carfax shows prior damage (yes/no) 9. doc fee quoted 10. doc fee negotiable (yes/no) 11. doc fee agreed (after negotiation) 12. lowest price dealer will accept
+</fields>
+
+<rules>
+- Tone: professional, not overly friendly, human not robotic; imperfect punctuation is fine (e.g. 'Can you remind me the car make/model and year? Appreciate it').
+- Ask in field order; where it makes sense, ask make, model, year and miles in one message.
+- Never ask for a field you already have.
+- Negotiation, once 1-9 are known: ask 10; if negotiable and over $150, push the doc fee down, then negotiate the price.
+- Cite worn tires, a rebuilt title or carfax damage as leverage; don't over-negotiate - if the dealer won't budge, move on.
+- Accept if the price drops more than 15% from listing; record the final doc fee as 11.
+- If the dealer says they'll get back to you / gather info: answer any question they also asked first (e.g. "I'll discuss with my GM. Do you have a trade?" -> "No trade, and I'll be financing. Thanks!"), otherwise just say "Thanks", then return '# WAITING #'.
+- If the dealer says they sent a carfax link, stop asking and set 7 and 8 to 'check_carfax'.
+- If the dealer suggests a visit before you have 1-12, politely deflect ("Let me get a bit more info before we schedule a visit") and keep asking.
+</rules>
+
+<output>
+Only the message text to send (no "You: " prefix). Return '#SCHEDULE#' only when you are certain you have all of 1-12.
+</output>"""
+
+
+# Markers the buyer agent ends a reply with ('# WAITING #', '#SCHEDULE#'), tolerant of spacing
+_SENTINEL_RE = re.compile(r'#\s*(SCHEDULE|WAITING)\s*#')
+
+
+def parse_agent_reply(text: str) -> Tuple[str, Optional[str]]:
+    """Split an agent reply into (message before the marker, 'SCHEDULE' / 'WAITING' / None)"""
+    match = _SENTINEL_RE.search(text)
+    if not match:
+        return text, None
+    return text[:match.start()].rstrip(), match.group(1)
+
+
 async def get_ai_response(conversation_transcript: str, known_data: Optional[Dict[str, Any]] = None, is_waiting_for_response: bool = False) -> str:
     """Get AI agent response using GPT-4o"""
     if not openai_client:
@@ -596,89 +888,37 @@ async def get_ai_response(conversation_transcript: str, known_data: Optional[Dic
     
     # Build known information section
     known_info_section = ''
-    if known_data:
-        known_fields = []
-        if known_data.get('make'):
-            known_fields.append(f"- Car make: {known_data['make']}")
-        if known_data.get('model'):
-            known_fields.append(f"- Car model: {known_data['model']}")
-        if known_data.get('year'):
-            known_fields.append(f"- Car year: {known_data['year']}")
-        if known_data.get('miles') is not None:
-            known_fields.append(f"- Number of miles: {known_data['miles']:,}")
-        if known_data.get('listingPrice') is not None:
-            known_fields.append(f"- Listing price: ${known_data['listingPrice']:,}")
-        if known_data.get('tireLifeLeft') is not None:
-            known_fields.append(f"- Tires have life left: {'Yes' if known_data['tireLifeLeft'] else 'No'}")
-        if known_data.get('titleStatus'):
-            title_display = 'Check Carfax (link provided)' if known_data['titleStatus'] == 'check_carfax' else known_data['titleStatus']
-            known_fields.append(f"- Title status: {title_display}")
-        if known_data.get('carfaxDamageIncidents') is not None:
-            carfax_display = {
-                'yes': 'Yes',
-                'no': 'No',
-                'unsure': 'Unsure',
-                'check_carfax': 'Check Carfax (link provided)'
-            }.get(known_data['carfaxDamageIncidents'], 'Unknown')
-            known_fields.append(f"- Carfax damage incidents: {carfax_display}")
-        if known_data.get('docFeeQuoted') is not None:
-            known_fields.append(f"- Doc fee quoted: ${known_data['docFeeQuoted']:,}")
-        if known_data.get('docFeeNegotiable') is not None:
-            known_fields.append(f"- Doc fee negotiable: {'Yes' if known_data['docFeeNegotiable'] else 'No'}")
-        if known_data.get('docFeeAgreed') is not None:
-            known_fields.append(f"- Doc fee agreed: ${known_data['docFeeAgreed']:,}")
-        if known_data.get('lowestPrice') is not None:
-            known_fields.append(f"- Lowest price: ${known_data['lowestPrice']:,}")
-        
-        if known_fields:
-            known_info_section = f"\n\nIMPORTANT: You already have the following information (do NOT ask for these again):\n" + '\n'.join(known_fields) + "\n\nOnly ask for information you don't already have."
-    
-    system_prompt = f"""You are an expert used car buyer. You are in a conversation with a used car dealer, who is selling a car that you indicated interest in online.
-
-Your task is to get the following pieces of information from the dealer:
-1. Car make
-2. Car model
-3. Car year
-4. Number of miles on the car
-5. Listing price
-6. Whether the tires have life left (yes or no)
-7. Is it a clean title or rebuilt title (clean or rebuilt)
-8. Does the carfax show any prior damage incidents (yes or no)
-9. Doc fee amount (the amount they quote)
-10. Whether the doc fee is negotiable (yes or no)
-11. Doc fee agreed upon (after negotiation, if applicable)
-12. Lowest price dealer will accept{known_info_section}
-
-Guidelines:
-1. Maintain a professional, but not overly friendly tone. Do not sound too robotic - you are impersonating a human who is a savvy used car buyer. Do not use perfect punctuation (e.g., 'Can you remind me the car make/model and year? Appreciate it').
-2. Try to obtain the pieces of information above in order (e.g., don't ask for the age of the tires before you know the car's make)
-3. Where it makes sense, I would ask for the car make, model, year and number of miles in one message
-4. Once you have all information from items 1-9 (make, model, year, miles, listing price, tire life status, title status, carfax damage incidents, and doc fee quoted), ask about item 10 (whether the doc fee is negotiable). If the doc fee is negotiable and greater than $150, try to negotiate a lower doc fee. Then negotiate the listing price. If the tires do not have life left, if it's a rebuilt title, or if there are carfax damage incidents, mention those as reasons why you are trying to negotiate. Do not attempt an unreasonable amount of negotiation - if the dealer is not willing to negotiate, move on to the next question. If they lower the price more than 15% from the listing price, accept the deal. After negotiation, record the final agreed-upon doc fee in item 11.
-5. DO NOT ask for information you already have. If you already know the make, model, year, miles, or listing price, skip asking for those and move on to information you don't have.
-6. CRITICAL: If the dealer says that they will work on getting information for you, will get back to you, will update you, or similar phrases indicating they need time to gather information, you should acknowledge this. However, if the dealer ALSO asks a question in the same message, you must answer their question first, then acknowledge that you'll wait. For example, if they say "I'll discuss with my GM. Do you have a trade?", respond with something like "No trade, and I'll be financing. Thanks!" and then return '# WAITING #'. If they only say they'll get back without asking a question, respond with ONLY a simple "Thank you" or "Thanks" and then return '# WAITING #'. This tells the system to stop responding until the dealer provides actual new information.
-7. If the dealer indicates that they have sent a link to the carfax (whether in the thread or in a separate message), do not continue asking for the carfax, and just make the values for 7 and 8 'check_carfax'.
-8. CRITICAL: If the dealer asks you to come in and see the car, or suggests scheduling a visit, BEFORE you have all the information you need (items 1-12), you must deflect politely. Say something like "I'd like to ask a few more questions first" or "Let me get a bit more info before we schedule a visit" and then continue asking for the missing information. Only agree to schedule a visit AFTER you have all the information and are ready to return '#SCHEDULE#'.
-
-Return nothing but the message you would like to send the dealer (e.g., do not pre-pend "You: " or something similar to message). If the dealer says they'll get back to you, return '# WAITING #' after saying thank you. Once you have captured ALL of the information above (items 1-12), return '#SCHEDULE#' to indicate you're ready to schedule a visit. Do not return '#SCHEDULE#' unless you are absolutely certain you have all of the information required."""
+    known_fields = _format_known_fields(known_data)
+    if known_fields:
+        known_info_section = f"You already have the following information (do NOT ask for these again):\n" + '\n'.join(known_fields) + "\n\n"
     
-    user_prompt = f"""Here is the transcript of the conversation so far:
+    user_prompt = f"""{known_info_section}Here is the transcript of the conversation so far:
 
-{conversation_transcript or '(No conversation yet)'}
+{_windowed_transcript(conversation_transcript, _AGENT_TRANSCRIPT_MAX_TURNS) or '(No conversation yet)'}
 
 Please output what you think your next message to the dealer should be."""
     
     try:
-        completion = openai_client.chat.completions.create(
+        stream = await _openai().chat.completions.create(
             model='gpt-4o',
             messages=[
-                {'role': 'system', 'content': system_prompt},
+                {'role': 'system', 'content': _BUYER_SYSTEM_PROMPT},
                 {'role': 'user', 'content': user_prompt}
             ],
             temperature=0.7,
-            max_tokens=200
+            max_tokens=200,
+            stream=True
         )
         
-        response = completion.choices[0].message.content.strip()
+        response = ''
+        async for chunk in stream:
+            if chunk.choices:
+                response += chunk.choices[0].delta.content or ''
+            # Nothing after a sentinel is used, so stop generating once one appears
+            if _SENTINEL_RE.search(response):
+                await stream.response.aclose()
+                break
+        response = response.strip()
         
         if not response:
             raise ValueError('No response from OpenAI')
@@ -707,27 +947,24 @@ async def send_sms(to: str, message: str, retries: int = 3) -> Dict[str, Any]:
             if attempt > 1:
                 print(f'Sending payload: {payload}')
             
-            response = requests.post(
+            response = await http_client.post(
                 f'{MTA_API_BASE_URL}/send',
                 json=payload,
                 headers={
                     'Authorization': f'Bearer {MTA_API_KEY}',
                     'Content-Type': 'application/json'
-                },
-                timeout=10
+                }
             )
             response.raise_for_status()
             return response.json()
-        except requests.exceptions.RequestException as error:
-            is_network_error = (
-                isinstance(error, requests.exceptions.ConnectionError) or
-                isinstance(error, requests.exceptions.Timeout)
-            )
+        except httpx.HTTPError as error:
+            is_network_error = isinstance(error, (httpx.NetworkError, httpx.TimeoutException))
             
             if is_network_error and attempt < retries:
-                delay = min(1000 * (2 ** (attempt - 1)), 5000)  # Exponential backoff, max 5 seconds
-                print(f'Network error on attempt {attempt}, retrying in {delay}ms... {error}')
-                await asyncio.sleep(delay / 1000)
+                # Exponential backoff capped at 5 seconds, jittered so concurrent retries spread out
+                delay = min(2 ** (attempt - 1), 5) * (0.5 + random.random())
+                print(f'Network error on attempt {attempt}, retrying in {delay * 1000:.0f}ms... {error}')
+                await asyncio.sleep(delay)
                 continue
             
             # If it's the last attempt or not a network error, raise
@@ -739,21 +976,47 @@ async def send_sms(to: str, message: str, retries: int = 3) -> Dict[str, Any]:
 
 # ==================== VISIT SCHEDULING AGENT ====================
 
-def check_if_message_about_visit_scheduling(message: str) -> bool:
-    """Check if dealer message is about scheduling, modifying, or canceling a visit"""
-    if not openai_client:
-        # Fallback to keyword matching
-        visit_keywords = [
-            'visit', 'appointment', 'schedule', 'come in', 'come by', 'stop by',
-            'when can you', 'what time', 'available', 'availability', 'cancel',
-            'reschedule', 'change time', 'change date', 'meet', 'see the car',
-            'test drive', 'view', 'inspect'
-        ]
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in visit_keywords)
-    
-    try:
-        prompt = f"""Does this dealer message ask about scheduling a visit, appointment, or meeting to see the car? This includes:
+# Central Time zone; resolved once so visit times share a single tzinfo instance
+_CT_TZ = gettz('America/Chicago')
+
+# Replies sent to the dealer once a visit time is booked
+_VISIT_TIME_FORMAT = '%A, %B %d at %I:%M %p'
+_CONFIRMED_TIME_MSG = "Perfect! I've scheduled a visit for {} Central Time. Looking forward to seeing you then!"
+_ALTERNATIVE_TIME_MSG = "I'm not available at that exact time, but how about {} Central Time? I've scheduled it for then."
+_PREFERRED_TIME_MSG = "I'll come by at {} Central Time - thank you."
+_PROPOSED_TIME_MSG = "How about {} Central Time? I've scheduled it for then."
+
+# Visit keywords, compiled into one word-bounded, case-insensitive alternation; stems
+# cover inflections ("scheduled", "visiting", "meeting") without substring hits like "reviews"
+_VISIT_KEYWORD_RE = re.compile(
+    r'\b(visit\w*|appointments?|(re)?schedul\w*|come\s+in|come\s+by|stop\s+by|when\s+can\s+you|'
+    r'what\s+time|cancel\w*|change\s+(the\s+)?(time|date)|meet(ing)?|'
+    r'see\s+the\s+car|test\s+driv\w*|inspect\w*)\b',
+    re.IGNORECASE
+)
+# Words that often mean visit intent but also show up in plain listing replies
+# ("yes it's still available"); these never decide on their own and go to the LLM
+_WEAK_VISIT_KEYWORD_RE = re.compile(r'\b(available|availability|view(ing)?)\b', re.IGNORECASE)
+# Times, dates and day names; messages with these but no strong keyword go to the LLM classifier,
+# and the visit extractor is only called when the recent conversation has one
+_TIME_REFERENCE_RE = re.compile(
+    r'\b(\d{1,2}(:\d{2})?\s*(am|pm|a\.m|p\.m)|\d{1,2}:\d{2}|\d{1,2}[/-]\d{1,2}|'
+    r'(mon|tues?|wed(nes)?|thu(rs)?|fri|sat(ur)?|sun)(day)?|'
+    r'today|tonight|tomorrow|weekend|noon|morning|afternoon|evening)\b',
+    re.IGNORECASE
+)
+# Keyword hits in messages shorter than this are trusted without the LLM
+_VISIT_KEYWORD_MAX_LENGTH = 200
+
+# LLM verdicts keyed by message hash, so retries and duplicate webhooks skip the call
+# (the classifier runs at temperature 0 with a fixed seed, so a cached verdict is the one it would give)
+_VISIT_INTENT_CACHE_MAX_ENTRIES = 4096
+_visit_intent_cache: Dict[str, bool] = {}
+
+
+_VISIT_CLASSIFIER_SYSTEM_PROMPT = """You are a helpful assistant that determines if a message is about scheduling visits or appointments.
+
+Does the dealer message ask about scheduling a visit, appointment, or meeting to see the car? This includes:
 - Asking when the buyer can come in/visit
 - Suggesting a time to meet
 - Asking about availability
@@ -761,39 +1024,94 @@ def check_if_message_about_visit_scheduling(message: str) -> bool:
 - Asking to reschedule or cancel a visit
 - Asking about test driving or viewing the car
 
-Message: "{message}"
-
 Respond with ONLY "YES" if it's about visit scheduling, or "NO" if it's not."""
-        
-        completion = openai_client.chat.completions.create(
-            model='gpt-4o',
+
+
+async def check_if_message_about_visit_scheduling(message: str) -> bool:
+    """Check if dealer message is about scheduling, modifying, or canceling a visit"""
+    has_keyword = _VISIT_KEYWORD_RE.search(message) is not None
+    if not openai_client:
+        # Fallback to keyword matching
+        return has_keyword
+    
+    # Strong keywords decide the clear cases; weak keywords and time references
+    # (the ambiguous middle band) cost an LLM call
+    if has_keyword and len(message) < _VISIT_KEYWORD_MAX_LENGTH:
+        return True
+    if not has_keyword and not _WEAK_VISIT_KEYWORD_RE.search(message) and not _TIME_REFERENCE_RE.search(message):
+        return False
+    
+    key = hashlib.sha1(message.encode('utf-8')).hexdigest()
+    cached = _visit_intent_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    try:
+        completion = await _openai().chat.completions.create(
+            model=CLASSIFIER_MODEL,
             messages=[
-                {'role': 'system', 'content': 'You are a helpful assistant that determines if a message is about scheduling visits or appointments.'},
-                {'role': 'user', 'content': prompt}
+                {'role': 'system', 'content': _VISIT_CLASSIFIER_SYSTEM_PROMPT},
+                {'role': 'user', 'content': f'Message: "{message}"'}
             ],
-            temperature=0.3,
+            temperature=0,
+            seed=0,
             max_tokens=10
         )
         
         response = completion.choices[0].message.content.strip().upper()
-        return response == 'YES'
+        is_visit = response == 'YES'
+        if len(_visit_intent_cache) >= _VISIT_INTENT_CACHE_MAX_ENTRIES:
+            _visit_intent_cache.clear()
+        _visit_intent_cache[key] = is_visit
+        return is_visit
     except Exception as error:
         print(f'Error checking if message is about visit scheduling: {error}')
         # On error, use keyword fallback
-        visit_keywords = [
-            'visit', 'appointment', 'schedule', 'come in', 'come by', 'stop by',
-            'when can you', 'what time', 'available', 'availability', 'cancel',
-            'reschedule', 'change time', 'change date', 'meet', 'see the car',
-            'test drive', 'view', 'inspect'
-        ]
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in visit_keywords)
+        return has_keyword
+
+
+# Availability lists keyed by minute-truncated window plus Visit.generation(), so any
+# visit write invalidates them
+_AVAILABILITY_CACHE_TTL_SECONDS = 30
+_AVAILABILITY_CACHE_MAX_ENTRIES = 256
+_availability_cache: Dict[tuple, tuple] = {}
+_availability_in_flight: Dict[tuple, asyncio.Task] = {}
 
 
-def get_visit_availability(start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+async def get_visit_availability(start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
     """Get available time slots for visits between start_date and end_date"""
     from models import Visit
-    from bson import ObjectId
+    
+    cache_key = (int(start_date.timestamp()) // 60, int(end_date.timestamp()) // 60, Visit.generation())
+    cached = _availability_cache.get(cache_key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    # Concurrent callers for the same window share one query
+    task = _availability_in_flight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(asyncio.to_thread(_load_visit_availability, start_date, end_date))
+        _availability_in_flight[cache_key] = task
+        task.add_done_callback(lambda _: _availability_in_flight.pop(cache_key, None))
+    availability = await asyncio.shield(task)
+    
+    if len(_availability_cache) >= _AVAILABILITY_CACHE_MAX_ENTRIES:
+        _availability_cache.clear()
+    _availability_cache[cache_key] = (time.monotonic() + _AVAILABILITY_CACHE_TTL_SECONDS, availability)
+    return availability
+
+
+def _visit_epoch(value) -> float:
+    """UTC epoch seconds for a stored visit time (PyMongo hands back naive UTC datetimes)"""
+    visit_time = datetime.fromisoformat(value) if isinstance(value, str) else value
+    if visit_time.tzinfo is None:
+        visit_time = visit_time.replace(tzinfo=timezone.utc)
+    return visit_time.timestamp()
+
+
+def _load_visit_availability(start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+    """Query the visits in a window (blocking; see get_visit_availability)"""
+    from models import Visit
     
     # Find all visits in the date range
     visits = Visit.find({
@@ -809,6 +1127,7 @@ def get_visit_availability(start_date: datetime, end_date: datetime) -> List[Dic
         {
             "visitId": str(v["_id"]),
             "scheduledTime": v["scheduledTime"].isoformat() if isinstance(v["scheduledTime"], datetime) else v["scheduledTime"],
+            "scheduledEpoch": _visit_epoch(v["scheduledTime"]),
             "dealerPhoneNumber": v.get("dealerPhoneNumber"),
             "status": v.get("status", "scheduled")
         }
@@ -870,35 +1189,7 @@ def delete_visit(visit_id: str) -> bool:
     return result.deleted_count > 0
 
 
-async def get_scheduling_agent_response(conversation_transcript: str, thread_id: str, dealer_phone_number: str) -> Optional[str]:
-    """Get scheduling agent response for visit-related messages"""
-    if not openai_client:
-        return None
-    
-    from models import Visit, CarListing, Thread
-    from bson import ObjectId
-    
-    # Get existing visits for this thread
-    existing_visits = Visit.find({"threadId": ObjectId(thread_id)})
-    visits_info = []
-    for visit in existing_visits:
-        visits_info.append({
-            "visitId": str(visit["_id"]),
-            "scheduledTime": visit["scheduledTime"].isoformat() if isinstance(visit["scheduledTime"], datetime) else str(visit["scheduledTime"]),
-            "status": visit.get("status", "scheduled"),
-            "notes": visit.get("notes", "")
-        })
-    
-    # Get car listing info if available
-    car_listing = CarListing.find_one({"threadId": ObjectId(thread_id)})
-    car_info = ""
-    if car_listing:
-        car_info = f"Car: {car_listing.get('year', '')} {car_listing.get('make', '')} {car_listing.get('model', '')}"
-    
-    # Get thread info
-    thread = Thread.find_by_id(thread_id)
-    
-    system_prompt = f"""You are a scheduling assistant for car dealership visits. Your job is to help schedule, modify, or cancel visits to see cars at dealerships.
+_SCHEDULING_AGENT_SYSTEM_PROMPT = """You are a scheduling assistant for car dealership visits. Your job is to help schedule, modify, or cancel visits to see cars at dealerships.
 
 You have access to the following tools:
 1. get_visit_availability(start_date, end_date) - Get existing visits in a date range
@@ -906,11 +1197,7 @@ You have access to the following tools:
 3. modify_visit(visit_id, scheduled_time, notes, status) - Modify an existing visit
 4. delete_visit(visit_id) - Delete/cancel a visit
 
-Current context:
-- Thread ID: {thread_id}
-- Dealer Phone: {dealer_phone_number}
-- {car_info}
-- Existing visits: {json.dumps(visits_info, indent=2) if visits_info else 'None'}
+The thread, dealer phone, car and existing visits are given at the start of the user message.
 
 IMPORTANT RULES:
 1. All times should be in Central Time (CT)
@@ -931,78 +1218,114 @@ TOOL_CALL: tool_name(arg1=value1, arg2=value2)
 After using a tool, you'll get the result. Then provide a natural response to the dealer.
 
 If you need to ask for more information, just respond naturally without using tools."""
+
+
+async def get_scheduling_agent_response(conversation_transcript: str, thread_id: str, dealer_phone_number: str, car_listing: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Get scheduling agent response for visit-related messages (pass car_listing if already fetched)"""
+    if not openai_client:
+        return None
+    
+    from models import Visit, CarListing
+    from bson import ObjectId
+    
+    thread_query = {"threadId": ObjectId(thread_id)}
+    # Get existing visits for this thread (and the car listing if not passed in) concurrently
+    if car_listing is None:
+        existing_visits, car_listing = await asyncio.gather(
+            asyncio.to_thread(lambda: list(Visit.find(thread_query))),
+            asyncio.to_thread(CarListing.find_one, thread_query)
+        )
+    else:
+        existing_visits = await asyncio.to_thread(lambda: list(Visit.find(thread_query)))
+    visits_info = [
+        {
+            "visitId": str(visit["_id"]),
+            "scheduledTime": visit["scheduledTime"].isoformat() if isinstance(visit["scheduledTime"], datetime) else str(visit["scheduledTime"]),
+            "status": visit.get("status", "scheduled"),
+            "notes": visit.get("notes", "")
+        }
+        for visit in existing_visits
+    ]
     
-    user_prompt = f"""Here is the conversation transcript:
+    car_info = ""
+    if car_listing:
+        car_info = f"Car: {car_listing.get('year', '')} {car_listing.get('make', '')} {car_listing.get('model', '')}"
+    
+    user_prompt = f"""Current context:
+- Thread ID: {thread_id}
+- Dealer Phone: {dealer_phone_number}
+- {car_info}
+- Existing visits: {json.dumps(visits_info, indent=2) if visits_info else 'None'}
+
+Here is the conversation transcript:
 
 {conversation_transcript}
 
 What should you do? If you need to use a tool, use the TOOL_CALL format. Otherwise, respond naturally to the dealer."""
     
     try:
-        completion = openai_client.chat.completions.create(
+        completion = await _openai().chat.completions.create(
             model='gpt-4o',
             messages=[
-                {'role': 'system', 'content': system_prompt},
+                {'role': 'system', 'content': _SCHEDULING_AGENT_SYSTEM_PROMPT},
                 {'role': 'user', 'content': user_prompt}
             ],
             temperature=0.7,
-            max_tokens=300
+            max_tokens=200
         )
         
         response = completion.choices[0].message.content.strip()
         
-        # Check if response contains a tool call
-        if "TOOL_CALL:" in response:
-            # Extract tool call
-            tool_call_line = [line for line in response.split('\n') if 'TOOL_CALL:' in line][0]
-            tool_call = tool_call_line.replace('TOOL_CALL:', '').strip()
-            
-            # Parse and execute tool call
-            try:
-                # Simple parsing - extract function name and arguments
-                if 'get_visit_availability' in tool_call:
-                    # This would need date parsing - for now, skip
-                    pass
-                elif 'create_visit' in tool_call:
-                    # Extract scheduled_time from tool_call
-                    # This is simplified - in production, you'd want better parsing
-                    import re
-                    from dateutil import parser as date_parser
-                    
-                    # Try to extract datetime from the response or conversation
-                    # For now, we'll need to parse the conversation for date/time
-                    time_match = re.search(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', conversation_transcript)
-                    if time_match:
-                        # This is a simplified version - you'd want better date parsing
-                        pass
-                elif 'modify_visit' in tool_call:
-                    # Extract visit_id and new info
-                    pass
-                elif 'delete_visit' in tool_call:
-                    # Extract visit_id
-                    pass
-            except Exception as tool_error:
-                print(f"Error executing tool call: {tool_error}")
-        
-        # For now, return the response (the agent will handle tool calls in a more sophisticated way)
-        # We'll implement a simpler version that extracts date/time from the conversation
+        # Tool calls are returned as text for the caller to act on
         return response
     except Exception as error:
         print(f'Error getting scheduling agent response: {error}')
         return None
 
 
-async def process_visit_scheduling(conversation_transcript: str, thread_id: str, dealer_phone_number: str, latest_message: str) -> Optional[Dict[str, Any]]:
-    """Process visit scheduling - check availability and schedule visits"""
+_SCHEDULING_EXTRACTOR_SYSTEM_PROMPT = """You are a data extraction assistant. Analyze the conversation to determine if the dealer has proposed a specific date and time for a visit.
+
+Today's date is given at the start of the user message (Central Time). When the dealer mentions a day name like "Saturday" or "Monday", interpret it relative to today's date.
+
+If the dealer has proposed a specific date and time, set dealer_proposed_datetime to it in ISO format (YYYY-MM-DDTHH:MM:SS, 24-hour, Central Time). For relative dates like "Sunday" or "tomorrow", calculate the actual date based on today.
+
+If the dealer has NOT proposed a specific date and time (just asked to schedule or come in), set dealer_proposed_datetime to null.
+
+Return ONLY valid JSON: {"dealer_proposed_datetime": "YYYY-MM-DDTHH:MM:SS or null"}"""
+
+# Strict schema for the extractor, so the reply always parses into this one key
+_SCHEDULING_EXTRACTOR_RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'visit_proposal',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                'dealer_proposed_datetime': {'type': ['string', 'null']}
+            },
+            'required': ['dealer_proposed_datetime'],
+            'additionalProperties': False
+        }
+    }
+}
+
+
+# Extracted datetimes keyed by extraction-prompt hash (deterministic: temperature 0, fixed seed)
+_VISIT_PROPOSAL_CACHE_MAX_ENTRIES = 1024
+_visit_proposal_cache: Dict[str, Optional[str]] = {}
+
+
+async def process_visit_scheduling(conversation_transcript: str, thread_id: str, dealer_phone_number: str, latest_message: str, car_listing: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Process visit scheduling - check availability and schedule visits (pass car_listing if already fetched)"""
     if not openai_client:
         return None
     
-    from models import Visit, CarListing
+    from models import CarListing
     from bson import ObjectId
-    import re
     
     # Central Time timezone
-    ct_tz = gettz('America/Chicago')
+    ct_tz = _CT_TZ
     
     # Get today's date in Central Time for reference
     now_ct = datetime.now(ct_tz)
@@ -1011,16 +1334,23 @@ async def process_visit_scheduling(conversation_transcript: str, thread_id: str,
     
     # Get availability for next 2 days
     end_date = now_ct + timedelta(days=2)
-    existing_visits = get_visit_availability(now_ct, end_date)
+    # Car listing is only fetched when the caller didn't pass one, alongside the availability query
+    if car_listing is None:
+        existing_visits, car_listing = await asyncio.gather(
+            get_visit_availability(now_ct, end_date),
+            asyncio.to_thread(CarListing.find_one, {"threadId": ObjectId(thread_id)})
+        )
+    else:
+        existing_visits = await get_visit_availability(now_ct, end_date)
+    car_listing_id = str(car_listing["_id"]) if car_listing else None
+    
+    # Conflict math runs on the UTC epochs computed at load; CT is only for display
+    visit_epochs = sorted(visit['scheduledEpoch'] for visit in existing_visits)
     
     # Convert existing visits to a more readable format for GPT
     availability_info = []
-    for visit in existing_visits:
-        visit_time = datetime.fromisoformat(visit['scheduledTime']) if isinstance(visit['scheduledTime'], str) else visit['scheduledTime']
-        if visit_time.tzinfo is None:
-            visit_time = visit_time.replace(tzinfo=ct_tz)
-        else:
-            visit_time = visit_time.astimezone(ct_tz)
+    for epoch in visit_epochs:
+        visit_time = datetime.fromtimestamp(epoch, ct_tz)
         availability_info.append({
             "time": visit_time.strftime('%A, %B %d at %I:%M %p CT'),
             "datetime": visit_time.isoformat()
@@ -1029,118 +1359,94 @@ async def process_visit_scheduling(conversation_transcript: str, thread_id: str,
     availability_text = json.dumps(availability_info, indent=2) if availability_info else "No visits scheduled in the next 2 days"
     
     try:
-        # Use GPT to extract visit scheduling information and determine response
-        extraction_prompt = f"""You are a scheduling assistant. Analyze the conversation to determine if the dealer has proposed a specific date and time for a visit.
-
-IMPORTANT: Today is {today_day_name}, {today_str} (Central Time). When the dealer mentions a day name like "Saturday" or "Monday", interpret it relative to today's date.
+        dealer_datetime_str = None
+        # A time agreed in an earlier turn ("that works") still needs extracting, so look at the
+        # recent window too; with no time-like token anywhere, go straight to proposing a time
+        recent_transcript = _windowed_transcript(conversation_transcript, _EXTRACTOR_TRANSCRIPT_MAX_TURNS)
+        if _TIME_REFERENCE_RE.search(latest_message) or _TIME_REFERENCE_RE.search(recent_transcript or ''):
+            # Use GPT to extract visit scheduling information and determine response
+            extraction_prompt = f"""Today is {today_day_name}, {today_str} (Central Time).
 
 Latest dealer message: "{latest_message}"
 
-Full conversation:
-{conversation_transcript}
+Recent conversation:
+{recent_transcript}
 
 Your existing scheduled visits in the next 2 days:
-{availability_text}
-
-If the dealer has proposed a specific date and time, extract:
-- dealer_proposed_date: The date (format: YYYY-MM-DD). For relative dates like "Sunday" or "tomorrow", calculate the actual date based on today ({today_str}).
-- dealer_proposed_time: The time (format: HH:MM in 24-hour format, Central Time)
-- dealer_proposed_datetime: Combined datetime in ISO format (YYYY-MM-DDTHH:MM:SS)
-
-If the dealer has NOT proposed a specific time (just asked to schedule or come in), set dealer_proposed_date and dealer_proposed_time to null.
-
-Return ONLY valid JSON:
-{{
-  "dealer_proposed_date": "YYYY-MM-DD or null",
-  "dealer_proposed_time": "HH:MM or null",
-  "dealer_proposed_datetime": "YYYY-MM-DDTHH:MM:SS or null"
-}}"""
-        
-        completion = openai_client.chat.completions.create(
-            model='gpt-4o',
-            messages=[
-                {'role': 'system', 'content': 'You are a data extraction assistant. Extract visit scheduling information from conversations.'},
-                {'role': 'user', 'content': extraction_prompt}
-            ],
-            temperature=0.3,
-            response_format={'type': 'json_object'}
-        )
-        
-        response_text = completion.choices[0].message.content.strip()
-        data = json.loads(response_text)
-        
-        dealer_date = data.get('dealer_proposed_date')
-        dealer_time = data.get('dealer_proposed_time')
-        dealer_datetime_str = data.get('dealer_proposed_datetime')
-        
-        # Get car listing if available
-        car_listing = CarListing.find_one({"threadId": ObjectId(thread_id)})
-        car_listing_id = str(car_listing["_id"]) if car_listing else None
+{availability_text}"""
+            
+            # The prompt carries today's date, the messages and availability, so its hash is the full input
+            key = hashlib.sha1(extraction_prompt.encode('utf-8')).hexdigest()
+            if key in _visit_proposal_cache:
+                dealer_datetime_str = _visit_proposal_cache[key]
+            else:
+                completion = await _openai().chat.completions.create(
+                    model=CLASSIFIER_MODEL,
+                    messages=[
+                        {'role': 'system', 'content': _SCHEDULING_EXTRACTOR_SYSTEM_PROMPT},
+                        {'role': 'user', 'content': extraction_prompt}
+                    ],
+                    temperature=0,
+                    seed=0,
+                    max_tokens=80,
+                    response_format=_SCHEDULING_EXTRACTOR_RESPONSE_FORMAT
+                )
+                
+                response_text = completion.choices[0].message.content.strip()
+                data = orjson.loads(response_text)
+                
+                dealer_datetime_str = data.get('dealer_proposed_datetime')
+                if len(_visit_proposal_cache) >= _VISIT_PROPOSAL_CACHE_MAX_ENTRIES:
+                    _visit_proposal_cache.clear()
+                _visit_proposal_cache[key] = dealer_datetime_str
         
         # If dealer proposed a specific time, check availability
-        if dealer_date and dealer_time:
+        if dealer_datetime_str:
             try:
-                # Parse the proposed datetime
-                if dealer_datetime_str:
+                # Parse the proposed datetime (strict ISO fast path; dateutil only if the model strays)
+                try:
                     proposed_time = datetime.fromisoformat(dealer_datetime_str.replace('Z', '+00:00'))
-                else:
-                    datetime_str = f"{dealer_date} {dealer_time}"
-                    proposed_time = date_parser.parse(datetime_str, default=now_ct)
+                except ValueError:
+                    proposed_time = date_parser.parse(dealer_datetime_str, default=now_ct)
                 
                 # Ensure timezone
-                if proposed_time.tzinfo is None:
-                    proposed_time = proposed_time.replace(tzinfo=ct_tz)
-                else:
-                    proposed_time = proposed_time.astimezone(ct_tz)
+                proposed_time = _normalize_visit_time(proposed_time, ct_tz)
                 
                 # Validate it's not in the past
                 if proposed_time < now_ct:
                     # Propose a time instead
-                    result = await propose_available_time(now_ct, end_date, existing_visits, ct_tz, thread_id, dealer_phone_number, car_listing_id)
+                    result = await propose_available_time(now_ct, end_date, visit_epochs, ct_tz, thread_id, dealer_phone_number, car_listing_id)
                     return result if isinstance(result, dict) else {"message": result, "visit_scheduled": False}
                 
                 # Check if the proposed time conflicts with existing visits
-                # Allow visits within 1 hour of each other (buffer time)
-                conflict = False
-                for visit in existing_visits:
-                    visit_time = datetime.fromisoformat(visit['scheduledTime']) if isinstance(visit['scheduledTime'], str) else visit['scheduledTime']
-                    if visit_time.tzinfo is None:
-                        visit_time = visit_time.replace(tzinfo=ct_tz)
-                    else:
-                        visit_time = visit_time.astimezone(ct_tz)
-                    
-                    time_diff = abs((proposed_time - visit_time).total_seconds())
-                    if time_diff < 3600:  # Less than 1 hour apart
-                        conflict = True
-                        break
-                
-                if conflict:
+                # (visits must be at least an hour apart)
+                if _has_visit_conflict(visit_epochs, proposed_time.timestamp()):
                     # Propose an alternative time
-                    alternative_time = await find_next_available_time(proposed_time, existing_visits, ct_tz, end_date)
+                    alternative_time = await find_next_available_time(proposed_time, visit_epochs, ct_tz, end_date)
                     if alternative_time:
-                        visit_id = create_visit(thread_id, alternative_time, dealer_phone_number, car_listing_id)
+                        visit_id = await asyncio.to_thread(create_visit, thread_id, alternative_time, dealer_phone_number, car_listing_id)
                         return {
-                            "message": f"I'm not available at that exact time, but how about {alternative_time.strftime('%A, %B %d at %I:%M %p')} Central Time? I've scheduled it for then.",
+                            "message": _ALTERNATIVE_TIME_MSG.format(alternative_time.strftime(_VISIT_TIME_FORMAT)),
                             "visit_scheduled": True
                         }
                     else:
-                        result = await propose_available_time(now_ct, end_date, existing_visits, ct_tz, thread_id, dealer_phone_number, car_listing_id)
+                        result = await propose_available_time(now_ct, end_date, visit_epochs, ct_tz, thread_id, dealer_phone_number, car_listing_id)
                         return result if isinstance(result, dict) else {"message": result, "visit_scheduled": False}
                 else:
                     # Time is available, create the visit
-                    visit_id = create_visit(thread_id, proposed_time, dealer_phone_number, car_listing_id)
+                    visit_id = await asyncio.to_thread(create_visit, thread_id, proposed_time, dealer_phone_number, car_listing_id)
                     return {
-                        "message": f"Perfect! I've scheduled a visit for {proposed_time.strftime('%A, %B %d at %I:%M %p')} Central Time. Looking forward to seeing you then!",
+                        "message": _CONFIRMED_TIME_MSG.format(proposed_time.strftime(_VISIT_TIME_FORMAT)),
                         "visit_scheduled": True
                     }
             except Exception as e:
                 print(f"Error processing proposed time: {e}")
                 # Fall through to propose a time
-                result = await propose_available_time(now_ct, end_date, existing_visits, ct_tz, thread_id, dealer_phone_number, car_listing_id)
+                result = await propose_available_time(now_ct, end_date, visit_epochs, ct_tz, thread_id, dealer_phone_number, car_listing_id)
                 return result if isinstance(result, dict) else {"message": result, "visit_scheduled": False}
         else:
             # Dealer didn't propose a specific time, propose one
-            result = await propose_available_time(now_ct, end_date, existing_visits, ct_tz, thread_id, dealer_phone_number, car_listing_id)
+            result = await propose_available_time(now_ct, end_date, visit_epochs, ct_tz, thread_id, dealer_phone_number, car_listing_id)
             return result if isinstance(result, dict) else {"message": result, "visit_scheduled": False}
     except Exception as error:
         print(f'Error processing visit scheduling: {error}')
@@ -1150,43 +1456,47 @@ Return ONLY valid JSON:
         }
 
 
-async def find_next_available_time(proposed_time: datetime, existing_visits: List[Dict[str, Any]], ct_tz, end_date: datetime) -> Optional[datetime]:
+def _normalize_visit_time(value, tz) -> datetime:
+    """Parse a visit time (ISO string or datetime) into an aware datetime in tz; naive values are taken as tz"""
+    visit_time = datetime.fromisoformat(value) if isinstance(value, str) else value
+    if visit_time.tzinfo is None:
+        return visit_time.replace(tzinfo=tz)
+    if visit_time.tzinfo is tz:
+        return visit_time
+    return visit_time.astimezone(tz)
+
+
+_VISIT_BUFFER_SECONDS = 3600  # Visits must be at least an hour apart
+
+
+def _has_visit_conflict(visit_epochs: List[float], candidate: float) -> bool:
+    """Check a candidate epoch against sorted visit epochs (only the nearest neighbours matter)"""
+    i = bisect.bisect_left(visit_epochs, candidate)
+    if i < len(visit_epochs) and visit_epochs[i] - candidate < _VISIT_BUFFER_SECONDS:
+        return True
+    return i > 0 and candidate - visit_epochs[i - 1] < _VISIT_BUFFER_SECONDS
+
+
+async def find_next_available_time(proposed_time: datetime, visit_epochs: List[float], ct_tz, end_date: datetime) -> Optional[datetime]:
     """Find the next available time slot near the proposed time"""
-    # Try times around the proposed time (before and after)
-    time_slots = []
+    # Everything is compared as epoch seconds; a datetime is only built for the winner
+    proposed_ts = proposed_time.timestamp()
+    now_ts = time.time()
+    end_ts = end_date.timestamp()
     
-    # Try 30 minutes before and after
+    # Try times around the proposed time (before and after), nearest first
     for offset_minutes in [-30, 30, -60, 60, -90, 90]:
-        candidate_time = proposed_time + timedelta(minutes=offset_minutes)
-        if candidate_time < datetime.now(ct_tz) or candidate_time > end_date:
+        candidate_ts = proposed_ts + offset_minutes * 60
+        if candidate_ts < now_ts or candidate_ts > end_ts:
             continue
         
-        # Check if this time conflicts
-        conflict = False
-        for visit in existing_visits:
-            visit_time = datetime.fromisoformat(visit['scheduledTime']) if isinstance(visit['scheduledTime'], str) else visit['scheduledTime']
-            if visit_time.tzinfo is None:
-                visit_time = visit_time.replace(tzinfo=ct_tz)
-            else:
-                visit_time = visit_time.astimezone(ct_tz)
-            
-            time_diff = abs((candidate_time - visit_time).total_seconds())
-            if time_diff < 3600:  # Less than 1 hour apart
-                conflict = True
-                break
-        
-        if not conflict:
-            time_slots.append(candidate_time)
-    
-    if time_slots:
-        # Return the closest one to the proposed time
-        time_slots.sort(key=lambda t: abs((t - proposed_time).total_seconds()))
-        return time_slots[0]
+        if not _has_visit_conflict(visit_epochs, candidate_ts):
+            return datetime.fromtimestamp(candidate_ts, ct_tz)
     
     return None
 
 
-async def propose_available_time(now_ct: datetime, end_date: datetime, existing_visits: List[Dict[str, Any]], ct_tz, thread_id: str, dealer_phone_number: str, car_listing_id: Optional[str]) -> Dict[str, Any]:
+async def propose_available_time(now_ct: datetime, end_date: datetime, visit_epochs: List[float], ct_tz, thread_id: str, dealer_phone_number: str, car_listing_id: Optional[str]) -> Dict[str, Any]:
     """Propose an available time within the next 2 days"""
     # Preferred times: 10am, 2pm, 4pm
     preferred_hours = [10, 14, 16]
@@ -1196,81 +1506,50 @@ async def propose_available_time(now_ct: datetime, end_date: datetime, existing_
     if now_ct.hour < 10:
         start_date = now_ct.replace(hour=10, minute=0, second=0, microsecond=0)
     
-    # Try to find an available slot
-    current_date = start_date.date()
-    end_date_only = end_date.date()
+    # Epoch of local midnight for each candidate day, taken from the noon UTC offset:
+    # DST switches at 2am, so every 9am-5pm slot shares noon's offset
+    first_day = start_date.date()
+    day_bases = [
+        datetime.combine(first_day + timedelta(days=offset), dt_time(12), tzinfo=ct_tz).timestamp() - 12 * 3600
+        for offset in range((end_date.date() - first_day).days + 1)
+    ]
+    now_ts = now_ct.timestamp()
+    end_ts = end_date.timestamp()
     
-    while current_date <= end_date_only:
-        for hour in preferred_hours:
-            candidate_time = datetime.combine(current_date, datetime.min.time().replace(hour=hour, minute=0))
-            if candidate_time.tzinfo is None:
-                candidate_time = candidate_time.replace(tzinfo=ct_tz)
-            else:
-                candidate_time = candidate_time.astimezone(ct_tz)
-            
-            if candidate_time < now_ct or candidate_time > end_date:
-                continue
-            
-            # Check if this time conflicts
-            conflict = False
-            for visit in existing_visits:
-                visit_time = datetime.fromisoformat(visit['scheduledTime']) if isinstance(visit['scheduledTime'], str) else visit['scheduledTime']
-                if visit_time.tzinfo is None:
-                    visit_time = visit_time.replace(tzinfo=ct_tz)
-                else:
-                    visit_time = visit_time.astimezone(ct_tz)
-                
-                time_diff = abs((candidate_time - visit_time).total_seconds())
-                if time_diff < 3600:  # Less than 1 hour apart
-                    conflict = True
-                    break
-            
-            if not conflict:
-                # Found an available time, create the visit
-                visit_id = create_visit(thread_id, candidate_time, dealer_phone_number, car_listing_id)
-                return {
-                    "message": f"I'll come by at {candidate_time.strftime('%A, %B %d at %I:%M %p')} Central Time - thank you.",
-                    "visit_scheduled": True
-                }
-        
-        # Move to next day
-        current_date += timedelta(days=1)
+    def first_free_slot(hours) -> Optional[datetime]:
+        # Flat, ordered candidate list (day by day, then hour) limited to the window
+        candidates = [
+            candidate_ts
+            for day_base in day_bases
+            for candidate_ts in (day_base + hour * 3600 for hour in hours)
+            if now_ts <= candidate_ts <= end_ts
+        ]
+        if not visit_epochs:
+            # Empty calendar: the earliest slot in the window is free
+            return datetime.fromtimestamp(candidates[0], ct_tz) if candidates else None
+        for candidate_ts in candidates:
+            if not _has_visit_conflict(visit_epochs, candidate_ts):
+                return datetime.fromtimestamp(candidate_ts, ct_tz)
+        return None
+    
+    # Try to find an available slot
+    candidate_time = first_free_slot(preferred_hours)
+    if candidate_time:
+        # Found an available time, create the visit
+        visit_id = await asyncio.to_thread(create_visit, thread_id, candidate_time, dealer_phone_number, car_listing_id)
+        return {
+            "message": _PREFERRED_TIME_MSG.format(candidate_time.strftime(_VISIT_TIME_FORMAT)),
+            "visit_scheduled": True
+        }
     
     # If no preferred time found, try any available time
-    current_date = start_date.date()
-    while current_date <= end_date_only:
-        for hour in range(9, 18):  # 9am to 5pm
-            candidate_time = datetime.combine(current_date, datetime.min.time().replace(hour=hour, minute=0))
-            if candidate_time.tzinfo is None:
-                candidate_time = candidate_time.replace(tzinfo=ct_tz)
-            else:
-                candidate_time = candidate_time.astimezone(ct_tz)
-            
-            if candidate_time < now_ct or candidate_time > end_date:
-                continue
-            
-            # Check if this time conflicts
-            conflict = False
-            for visit in existing_visits:
-                visit_time = datetime.fromisoformat(visit['scheduledTime']) if isinstance(visit['scheduledTime'], str) else visit['scheduledTime']
-                if visit_time.tzinfo is None:
-                    visit_time = visit_time.replace(tzinfo=ct_tz)
-                else:
-                    visit_time = visit_time.astimezone(ct_tz)
-                
-                time_diff = abs((candidate_time - visit_time).total_seconds())
-                if time_diff < 3600:
-                    conflict = True
-                    break
-            
-            if not conflict:
-                visit_id = create_visit(thread_id, candidate_time, dealer_phone_number, car_listing_id)
-                return {
-                    "message": f"How about {candidate_time.strftime('%A, %B %d at %I:%M %p')} Central Time? I've scheduled it for then.",
-                    "visit_scheduled": True
-                }
-        
-        current_date += timedelta(days=1)
+    candidate_time = first_free_slot(range(9, 18))  # 9am to 5pm
+    if candidate_time:
+        visit_id = await asyncio.to_thread(create_visit, thread_id, candidate_time, dealer_phone_number, car_listing_id)
+        return {
+            "message": _PROPOSED_TIME_MSG.format(candidate_time.strftime(_VISIT_TIME_FORMAT)),
+            "visit_scheduled": True
+        }
     
     # If still no time found, suggest they propose a time
     return {